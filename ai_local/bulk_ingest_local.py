@@ -0,0 +1,194 @@
+# bulk_ingest_local.py
+# NDJSON bulk ingest: reader -> chunker -> batched embedder(s) -> batched Chroma writer
+#
+# Stages are threads connected by bounded queues, so a slow stage blocks the
+# ones upstream of it (backpressure) instead of buffering the whole input.
+
+from .ingest_local import iter_chunks, embed_new_chunks, chunk_metadata, INGEST_EMBED_BATCH
+from .vectorstore_local import add_documents, flush as flush_vectors
+from datetime import datetime
+import numpy as np
+import threading
+import queue
+import json
+import time
+import os
+
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "256"))
+BULK_EMBED_WORKERS = int(os.getenv("BULK_EMBED_WORKERS", "2"))
+BULK_WRITE_BATCH = int(os.getenv("BULK_WRITE_BATCH", "512"))
+
+_DONE = object()
+_MAX_ERRORS_REPORTED = 20
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.documents = 0
+        self.chunks = 0
+        self.stored = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add(self, **counts):
+        with self.lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def error(self, where, e):
+        with self.lock:
+            self.error_count += 1
+            if len(self.errors) < _MAX_ERRORS_REPORTED:
+                self.errors.append(f"{where}: {e}")
+
+
+def _read(lines, doc_q, stats):
+    try:
+        for lineno, line in enumerate(lines, start=1):
+            try:
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                line = line.strip()
+                if not line:
+                    continue
+                doc = json.loads(line)
+                if not doc.get("employee_id") or not doc.get("content"):
+                    raise ValueError("employee_id and content required")
+            except Exception as e:
+                stats.error(f"line {lineno}", e)
+                continue
+            doc_q.put(doc)
+    finally:
+        # always release the downstream stages, even if the input stream breaks
+        doc_q.put(_DONE)
+
+
+def _chunk(doc_q, chunk_q, stats, n_embedders):
+    now = datetime.utcnow().isoformat()
+    while True:
+        doc = doc_q.get()
+        if doc is _DONE:
+            break
+        employee_id = doc["employee_id"]
+        collection = doc.get("collection")
+        md = chunk_metadata(employee_id, doc.get("source", "user_post"), now, doc.get("extra_meta"))
+        try:
+            n = 0
+            for ch in iter_chunks(doc["content"]):
+                chunk_q.put((collection, employee_id, md, ch))
+                n += 1
+            stats.add(documents=1, chunks=n)
+        except Exception as e:
+            stats.error(f"chunk employee_id={employee_id}", e)
+    for _ in range(n_embedders):
+        chunk_q.put(_DONE)
+
+
+def _embed(chunk_q, write_q, stats, batch_size):
+    done = False
+    while not done:
+        batch = []
+        while len(batch) < batch_size:
+            item = chunk_q.get()
+            if item is _DONE:
+                done = True
+                break
+            batch.append(item)
+            if chunk_q.empty() and batch:
+                # don't hold a partial batch while upstream is idle
+                break
+        groups = {}
+        for collection, employee_id, md, ch in batch:
+            groups.setdefault((collection, employee_id), []).append((md, ch))
+        for (collection, employee_id), items in groups.items():
+            try:
+                md_by_text = {ch: md for md, ch in items}
+                texts, ids, embeddings = embed_new_chunks(employee_id, [ch for _, ch in items], collection=collection)
+                if texts:
+                    write_q.put((collection, texts, ids, embeddings, [md_by_text[t] for t in texts]))
+            except Exception as e:
+                stats.error(f"embed employee_id={employee_id}", e)
+    write_q.put(_DONE)
+
+
+def _write(write_q, stats, n_embedders, batch_size):
+    pending = {}  # collection -> [(texts, ids, embeddings, metadatas)]
+
+    def flush():
+        for collection, items in pending.items():
+            texts, ids, embs, metas = [], [], [], []
+            for t, i, e, m in items:
+                texts += t
+                ids += i
+                embs.append(e)
+                metas += m
+            try:
+                add_documents(doc_texts=texts, embeddings=np.concatenate(embs), metadatas=metas,
+                              ids=ids, collection=collection)
+                stats.add(stored=len(ids))
+            except Exception as e:
+                stats.error("write", e)
+        pending.clear()
+
+    remaining = n_embedders
+    rows = 0
+    while remaining:
+        item = write_q.get()
+        if item is _DONE:
+            remaining -= 1
+            continue
+        pending.setdefault(item[0], []).append(item[1:])
+        rows += len(item[1])
+        if rows >= batch_size:
+            flush()
+            rows = 0
+    flush()
+    # the run is only done once the write-behind buffer has reached Chroma
+    try:
+        flush_vectors()
+    except Exception as e:
+        stats.error("flush", e)
+
+
+def bulk_ingest(lines, queue_size=BULK_QUEUE_SIZE, embed_workers=BULK_EMBED_WORKERS,
+                embed_batch=INGEST_EMBED_BATCH, write_batch=BULK_WRITE_BATCH):
+    """
+    lines: iterable of NDJSON lines (str or bytes), one document per line:
+        {"employee_id": "...", "source": "...", "content": "...", "extra_meta": {...}, "collection": "..."}
+    ("collection" is optional and defaults to the main collection.)
+    Returns a stats dict with documents/sec and chunks/sec.
+    """
+    stats = _Stats()
+    embed_workers = max(1, int(embed_workers))
+    doc_q = queue.Queue(maxsize=queue_size)
+    chunk_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=max(1, queue_size // max(1, embed_batch)) + embed_workers)
+
+    threads = [threading.Thread(target=_chunk, args=(doc_q, chunk_q, stats, embed_workers), name="bulk-chunker")]
+    threads += [
+        threading.Thread(target=_embed, args=(chunk_q, write_q, stats, embed_batch), name=f"bulk-embedder-{i}")
+        for i in range(embed_workers)
+    ]
+    threads.append(threading.Thread(target=_write, args=(write_q, stats, embed_workers, write_batch), name="bulk-writer"))
+
+    start = time.perf_counter()
+    for t in threads:
+        t.daemon = True
+        t.start()
+    _read(lines, doc_q, stats)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "documents": stats.documents,
+        "chunks": stats.chunks,
+        "stored_chunks": stats.stored,
+        "skipped_chunks": stats.chunks - stats.stored,
+        "error_count": stats.error_count,
+        "errors": stats.errors,
+        "elapsed_sec": round(elapsed, 3),
+        "docs_per_sec": round(stats.documents / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_sec": round(stats.chunks / elapsed, 2) if elapsed else 0.0,
+    }
@@ -0,0 +1,228 @@
+# embed_cache_local.py
+# Content-hash embedding cache: bounded in-memory LRU + optional memory-mapped disk tier
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import threading
+import hashlib
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+# Leave empty to keep the cache in memory only
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "")
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on path, held across processes (every worker sharing the cache dir)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _DiskTier:
+    """
+    Append-only float32 matrix on disk for one model.
+    <slug>.f32  raw rows, read through np.memmap
+    <slug>.idx  one sha256 per line, line number == row number
+    <slug>.json {"dim": N}
+    <slug>.lock held while appending, so processes sharing the directory
+                can't interleave their rows; each catches up on the others'
+                rows under the lock before appending its own
+    """
+
+    def __init__(self, directory, model_name):
+        os.makedirs(directory, exist_ok=True)
+        slug = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+        self.data_path = os.path.join(directory, f"{slug}.f32")
+        self.index_path = os.path.join(directory, f"{slug}.idx")
+        self.meta_path = os.path.join(directory, f"{slug}.json")
+        self.lock_path = os.path.join(directory, f"{slug}.lock")
+        self.dim = None
+        self.rows = {}
+        self._row_count = 0     # rows in the .f32 file (>= len(rows) if a key repeats)
+        self._index_offset = 0  # bytes of .idx already read
+        self._mmap = None
+        self._mmap_rows = 0
+        with _file_lock(self.lock_path):
+            self._refresh()
+
+    def _refresh(self):
+        """Read index entries appended since the last call. Call with the file lock held."""
+        if self.dim is None:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        chunk = b""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_offset)
+                chunk = f.read()
+        new_keys = chunk.decode("ascii").split()
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        if data_size != (self._row_count + len(new_keys)) * self.dim * 4:
+            # Index and data disagree (an interrupted append): row numbers can't
+            # be trusted, so start the tier over rather than serve a wrong row
+            self._reset()
+            return
+        for i, k in enumerate(new_keys):
+            self.rows.setdefault(k, self._row_count + i)
+        self._row_count += len(new_keys)
+        self._index_offset += len(chunk)
+
+    def _reset(self):
+        for path in (self.data_path, self.index_path):
+            open(path, "wb").close()
+        self.rows = {}
+        self._row_count = self._index_offset = 0
+        self._mmap, self._mmap_rows = None, 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        if self._mmap is None or row >= self._mmap_rows:
+            self._mmap_rows = self._row_count
+            self._mmap = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(self._mmap_rows, self.dim))
+        return np.array(self._mmap[row])
+
+    def put_many(self, keys, embs):
+        if not any(k not in self.rows for k in keys):
+            return
+        with _file_lock(self.lock_path):
+            self._refresh()
+            new = list({k: e for k, e in zip(keys, embs) if k not in self.rows}.items())
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = int(new[0][1].shape[0])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            # Data first, then index; a crash in between is caught by _refresh()
+            with open(self.data_path, "ab") as f:
+                f.write(np.ascontiguousarray(np.stack([e for _, e in new]), dtype=np.float32).tobytes())
+            entries = "".join(f"{k}\n" for k, _ in new).encode("ascii")
+            with open(self.index_path, "ab") as f:
+                f.write(entries)
+            for i, (k, _) in enumerate(new):
+                self.rows[k] = self._row_count + i
+            self._row_count += len(new)
+            self._index_offset += len(entries)
+
+
+class EmbeddingCache:
+    """Maps (model name, sha256(text)) to a float32 embedding row."""
+
+    def __init__(self, max_items=EMBED_CACHE_SIZE, cache_dir=EMBED_CACHE_DIR):
+        self.max_items = max(0, int(max_items))
+        self.cache_dir = cache_dir
+        self._lru = OrderedDict()
+        self._disk = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _disk_tier(self, model_name):
+        if not self.cache_dir:
+            return None
+        tier = self._disk.get(model_name)
+        if tier is None:
+            tier = self._disk[model_name] = _DiskTier(self.cache_dir, model_name)
+        return tier
+
+    def _remember(self, key, emb):
+        if self.max_items == 0:
+            return
+        self._lru[key] = emb
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model_name, keys):
+        """Return a list aligned with keys: cached row or None."""
+        out = []
+        with self._lock:
+            disk = self._disk_tier(model_name)
+            for k in keys:
+                emb = self._lru.get((model_name, k))
+                if emb is not None:
+                    self._lru.move_to_end((model_name, k))
+                elif disk is not None:
+                    emb = disk.get(k)
+                    if emb is not None:
+                        self.disk_hits += 1
+                        self._remember((model_name, k), emb)
+                if emb is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                out.append(emb)
+        return out
+
+    def put_many(self, model_name, keys, embs):
+        with self._lock:
+            for k, e in zip(keys, embs):
+                # Copy the row so the cache does not pin the whole batch matrix
+                self._remember((model_name, k), np.array(e, dtype=np.float32))
+            disk = self._disk_tier(model_name)
+            if disk is not None:
+                disk.put_many(keys, embs)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self.hits = self.misses = self.disk_hits = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "memory_items": len(self._lru),
+                "memory_capacity": self.max_items,
+                "disk_items": sum(len(t) for t in self._disk.values()),
+                "disk_dir": self.cache_dir or None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
@@ -2,26 +2,155 @@
 # Provides local embedding creation using sentence-transformers
 
 from sentence_transformers import SentenceTransformer
+from concurrent.futures import Future
+from .embed_cache_local import get_cache, text_key
 import numpy as np
+import threading
+import queue
+import time
 import os
 
 # Model selection: all-MiniLM-L6-v2 is small and fast
 EMBED_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
+# Micro-batching: concurrent callers are grouped into a single encode() call
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
 _model = None
+_model_lock = threading.Lock()
+_batcher = None
+_batcher_lock = threading.Lock()
 
 def get_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer(EMBED_MODEL_NAME)
+        with _model_lock:
+            if _model is None:
+                _model = SentenceTransformer(EMBED_MODEL_NAME)
     return _model
 
+def embedding_dim():
+    """Length of the model's embedding vectors."""
+    return get_model().get_sentence_embedding_dimension()
+
+def _encode(texts):
+    """Encode a list of texts straight through the model as a float32 matrix."""
+    model = get_model()
+    embs = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return np.asarray(embs, dtype=np.float32)
+
+
+class EmbeddingBatcher:
+    """
+    In-process embedding queue. Requests submitted from many threads are
+    collected for up to max_wait_ms (or until max_batch_size texts are queued)
+    and encoded together, then the rows are handed back to each caller. If
+    the shared encode fails, each caller's texts are retried on their own so
+    only the caller whose input fails gets the exception.
+    """
+
+    def __init__(self, encode_fn=_encode, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS,
+                 dim_fn=embedding_dim):
+        self.encode_fn = encode_fn
+        self.dim_fn = dim_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts):
+        """Queue texts for encoding. Returns a Future resolving to a float32 array."""
+        fut = Future()
+        texts = list(texts)
+        if not texts:
+            fut.set_result(np.zeros((0, self.dim_fn()), dtype=np.float32))
+            return fut
+        self._queue.put((texts, fut))
+        return fut
+
+    def embed(self, texts):
+        return self.submit(texts).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [t for item_texts, _ in batch for t in item_texts]
+            try:
+                embs = self.encode_fn(texts)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._encode_each(batch)
+                continue
+            offset = 0
+            for item_texts, fut in batch:
+                n = len(item_texts)
+                fut.set_result(embs[offset:offset + n])
+                offset += n
+
+    def _encode_each(self, batch):
+        for item_texts, fut in batch:
+            try:
+                fut.set_result(self.encode_fn(item_texts))
+            except Exception as e:
+                fut.set_exception(e)
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher()
+    return _batcher
+
 def embed_texts(texts):
     """
     texts: list[str]
-    returns: list[list[float]] embeddings
+    returns: np.ndarray of shape (len(texts), dim), dtype float32
+
+    Identical texts (by sha256) are served from the embedding cache; only
+    the unique misses are sent to the batcher.
     """
-    model = get_model()
-    embs = model.encode(texts, normalize_embeddings=True)
-    # convert to python lists
-    return [list(map(float, e)) for e in embs]
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, embedding_dim()), dtype=np.float32)
+    cache = get_cache()
+    keys = [text_key(t) for t in texts]
+    cached = cache.get_many(EMBED_MODEL_NAME, keys)
+
+    missing = {}
+    for t, k, emb in zip(texts, keys, cached):
+        if emb is None and k not in missing:
+            missing[k] = t
+    if missing:
+        miss_keys = list(missing)
+        embs = get_batcher().embed([missing[k] for k in miss_keys])
+        cache.put_many(EMBED_MODEL_NAME, miss_keys, embs)
+        fresh = dict(zip(miss_keys, embs))
+        cached = [emb if emb is not None else fresh[k] for k, emb in zip(keys, cached)]
+    return np.stack(cached).astype(np.float32, copy=False)
+
+def embedding_cache_stats():
+    """Hit/miss counters of the embedding cache."""
+    return get_cache().stats()
@@ -1,50 +1,247 @@
 # ingest_local.py
 # Chunking, embedding and storing pieces in Chroma
 
-from .embeddings_local import embed_texts
-from .vectorstore_local import add_documents
+from .embeddings_local import embed_texts, get_model
+from .vectorstore_local import add_documents, existing_ids, query, buffered_embeddings
 from datetime import datetime
-import math
+import numpy as np
+import hashlib
+import io
+import os
+import re
 
-DEFAULT_CHUNK_SIZE = 1000
-DEFAULT_OVERLAP = 200
+# Token budget per chunk, counted with the embedding model's own tokenizer.
+# Empty: the model's max_seq_length (less its special tokens); a larger value
+# is capped there, since the model would silently truncate the rest.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS") or 0) or None
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Chunks are embedded and stored this many at a time
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+# Cosine similarity at or above which a new chunk is treated as a near duplicate
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.97"))
 
-def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+_READ_BLOCK = 64 * 1024
+# A "sentence" with no boundary in this many chars is cut anyway to bound memory
+_MAX_SEGMENT_CHARS = 16 * 1024
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?])\s+")
+
+def _tokenizer():
+    return get_model().tokenizer
+
+def model_token_limit():
+    """Tokens of text the embedding model reads before truncating."""
+    return get_model().max_seq_length - _tokenizer().num_special_tokens_to_add()
+
+def _token_limit(max_tokens):
+    limit = model_token_limit()
+    return min(max_tokens, limit) if max_tokens else limit
+
+def count_tokens(text):
     if not text:
-        return []
-    chunks = []
+        return 0
+    return len(_tokenizer()(text, add_special_tokens=False)["input_ids"])
+
+def _split_long(segment, max_tokens):
+    """Cut a single over-long sentence into pieces of at most max_tokens, keeping the original text."""
+    offsets = _tokenizer()(segment, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
     start = 0
-    L = len(text)
-    while start < L:
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end >= L:
-            break
-        start = end - overlap
-    return chunks
-
-def ingest_text(employee_id, source, text, extra_meta=None):
+    while start < len(offsets):
+        end = min(start + max_tokens, len(offsets))
+        piece = segment[offsets[start][0]:offsets[end - 1][1]]
+        # a cut inside a word can re-tokenize differently; shrink until it fits
+        while end - start > 1 and count_tokens(piece) > max_tokens:
+            end -= 1
+            piece = segment[offsets[start][0]:offsets[end - 1][1]]
+        yield piece
+        start = end
+
+def _iter_blocks(source):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    if hasattr(source, "read"):
+        while True:
+            block = source.read(_READ_BLOCK)
+            if not block:
+                return
+            yield block
+    else:
+        yield from source
+
+def iter_segments(source):
+    """
+    Yield (sentence, starts_paragraph) from a str, file object or iterable of
+    str pieces. Only an unfinished trailing sentence is buffered.
+    """
+    buf = ""
+    new_para = True
+    for block in _iter_blocks(source):
+        buf += block
+        last = 0
+        for m in _BOUNDARY.finditer(buf):
+            if m.end() == len(buf):
+                # the whitespace run may continue in the next block
+                break
+            seg = buf[last:m.start()].strip()
+            if seg:
+                yield seg, new_para
+                new_para = False
+            if m.group().count("\n") >= 2:
+                new_para = True
+            last = m.end()
+        buf = buf[last:]
+        while len(buf) > _MAX_SEGMENT_CHARS:
+            yield buf[:_MAX_SEGMENT_CHARS], new_para
+            new_para = False
+            buf = buf[_MAX_SEGMENT_CHARS:]
+    tail = buf.strip()
+    if tail:
+        yield tail, new_para
+
+def iter_chunks(source, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Generator of chunks of at most max_tokens model tokens (default and cap:
+    model_token_limit()), packed from whole sentences and paragraphs.
+    Consecutive chunks share up to overlap_tokens tokens of trailing sentences.
+    Limits are checked on the joined chunk text, separators included.
+    """
+    max_tokens = _token_limit(max_tokens)
+    current = []  # [(text, tokens, starts_paragraph)]
+
+    def render(parts):
+        out = ""
+        for i, (text, _, para) in enumerate(parts):
+            if i:
+                out += "\n\n" if para else " "
+            out += text
+        return out
+
+    def fits(parts):
+        return count_tokens(render(parts)) <= max_tokens
+
+    for seg, para in iter_segments(source):
+        n = count_tokens(seg)
+        pieces = [(seg, n)] if n <= max_tokens else [(p, count_tokens(p)) for p in _split_long(seg, max_tokens)]
+        for text, n in pieces:
+            item = (text, n, para)
+            if current and not fits(current + [item]):
+                yield render(current)
+                # carry trailing sentences forward as overlap
+                carry, carry_tokens = [], 0
+                for prev in reversed(current):
+                    if carry_tokens + prev[1] > overlap_tokens:
+                        break
+                    carry.insert(0, prev)
+                    carry_tokens += prev[1]
+                while carry and not fits(carry + [item]):
+                    carry.pop(0)
+                current = carry
+            current.append(item)
+            para = False
+    if current:
+        yield render(current)
+
+def chunk_text(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    if not text:
+        return []
+    return list(iter_chunks(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens))
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def chunk_id(employee_id, text):
+    """Content-addressed id: the same chunk for the same employee always maps to one id."""
+    digest = hashlib.sha256(f"{employee_id}\x00{text}".encode("utf-8")).hexdigest()
+    return f"{employee_id}_{digest[:32]}"
+
+def _near_duplicates(employee_id, embeddings, threshold=NEAR_DUP_THRESHOLD, collection=None):
+    """
+    Boolean mask of rows that are near-duplicates of an earlier row in this
+    batch, a buffered chunk or a chunk already stored for the employee.
+    Embeddings are L2-normalised, so cosine similarity is a dot product.
+    """
+    n = len(embeddings)
+    dup = np.zeros(n, dtype=bool)
+    if n == 0 or threshold > 1:
+        return dup
+    sims = embeddings @ embeddings.T
+    for i in range(1, n):
+        if np.any(sims[i, :i][~dup[:i]] >= threshold):
+            dup[i] = True
+    where = {"employee_id": str(employee_id)}
+    # rows still in the write buffer are compared in memory, so this check
+    # never forces the buffer out to the backend
+    pending = buffered_embeddings(filter=where, collection=collection)
+    if pending is not None:
+        dup |= (embeddings @ pending.T).max(axis=1) >= threshold
+    try:
+        res = query(
+            query_embeddings=embeddings,
+            n_results=1,
+            filter=where,
+            include=["distances"],
+            collection=collection,
+            flush_buffer=False
+        )
+    except Exception:
+        # empty collection / no docs for this employee yet
+        return dup
+    for i, dists in enumerate(res.get("distances") or []):
+        # Chroma's default space is squared L2: |a-b|^2 = 2 - 2cos for unit vectors
+        if dists and 1 - dists[0] / 2 >= threshold:
+            dup[i] = True
+    return dup
+
+def embed_new_chunks(employee_id, chunks, collection=None):
+    """
+    Filter one employee's chunks down to the ones worth storing and embed them.
+    Chunks already stored under their content id are skipped before embedding;
+    near-duplicates of stored chunks are dropped after.
+    Returns (texts, ids, embeddings).
+    """
+    ids_by_text = {}
+    for ch in chunks:
+        ids_by_text.setdefault(ch, chunk_id(employee_id, ch))
+    known = existing_ids(list(ids_by_text.values()), collection=collection)
+    texts = [ch for ch, cid in ids_by_text.items() if cid not in known]
+    if not texts:
+        return [], [], None
+    embeddings = embed_texts(texts)
+    keep = ~_near_duplicates(employee_id, embeddings, collection=collection)
+    texts = [t for t, k in zip(texts, keep) if k]
+    return texts, [ids_by_text[t] for t in texts], embeddings[keep]
+
+def chunk_metadata(employee_id, source, created_at, extra_meta=None):
+    md = {"employee_id": str(employee_id), "source": source, "created_at": created_at}
+    md.update(extra_meta or {})
+    return md
+
+def ingest_text(employee_id, source, text, extra_meta=None, collection=None):
     """
     employee_id: int or str
     source: str e.g. "user_post", "github_readme"
-    text: str
+    text: str, file object or iterable of str pieces
     extra_meta: dict
-    Returns: number of chunks stored
+    collection: optional named collection (default: the main one)
+    Returns: number of new chunks stored
+
+    Idempotent: re-ingesting the same content stores and embeds nothing new.
     """
-    extra_meta = extra_meta or {}
-    chunks = chunk_text(text)
-    if not chunks:
+    if not text:
         return 0
-    embeddings = embed_texts(chunks)
-    # prepare metadata and ids
     now = datetime.utcnow().isoformat()
-    metadatas = []
-    ids = []
-    for i, ch in enumerate(chunks):
-        md = {"employee_id": str(employee_id), "source": source, "created_at": now}
-        md.update(extra_meta)
-        metadatas.append(md)
-        ids.append(f"{employee_id}_{source}_{int(datetime.utcnow().timestamp())}_{i}")
-    add_documents(doc_texts=chunks, embeddings=embeddings, metadatas=metadatas, ids=ids)
-    return len(chunks)
+    stored = 0
+    for batch in _batched(iter_chunks(text), INGEST_EMBED_BATCH):
+        texts, ids, embeddings = embed_new_chunks(employee_id, batch, collection=collection)
+        if not texts:
+            continue
+        metadatas = [chunk_metadata(employee_id, source, now, extra_meta) for _ in texts]
+        add_documents(doc_texts=texts, embeddings=embeddings, metadatas=metadatas, ids=ids, collection=collection)
+        stored += len(texts)
+    return stored
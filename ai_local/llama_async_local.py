@@ -0,0 +1,133 @@
+# llama_async_local.py
+# Asyncio front-end for the local Ollama server: concurrency limit + coalescing of identical prompts
+#
+# All generations run on one background event loop. At most OLLAMA_MAX_CONCURRENCY
+# requests reach Ollama at once (match it to how many parallel generations the
+# local model can serve, e.g. OLLAMA_NUM_PARALLEL). Identical prompts that are
+# already in flight share the running generation instead of starting a new one,
+# and finished answers are served from the response cache (llm_cache_local.py).
+# The HTTP call itself reuses llama_local's pooled keep-alive session in a worker
+# thread, so no extra HTTP client dependency is needed.
+
+from .llama_local import (
+    OLLAMA_MODEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+    call_local_llama as _call_blocking, stream_local_llama,
+)
+from .llm_cache_local import get_cache, prompt_key
+import concurrent.futures
+import asyncio
+import threading
+import os
+
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+
+
+class AsyncOllamaClient:
+    def __init__(self, max_concurrency=OLLAMA_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._semaphore = None
+        self._inflight = {}
+        self.requests = 0
+        self.generations = 0
+        self.coalesced = 0
+
+    async def _generate(self, key, prompt, max_tokens, temperature):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        cache = get_cache()
+        epoch = cache.epoch
+        async with self._semaphore:
+            self.generations += 1
+            # run_in_executor rather than asyncio.to_thread, which needs Python 3.9
+            text = await asyncio.get_running_loop().run_in_executor(
+                None, _call_blocking, prompt, max_tokens, temperature
+            )
+        cache.put(key, text, epoch=epoch)
+        return text
+
+    async def generate(self, prompt, max_tokens=512, temperature=0.3):
+        """
+        Return the model's text for prompt: from the response cache if fresh,
+        else by joining an identical in-flight call, else by generating.
+        """
+        self.requests += 1
+        key = prompt_key(OLLAMA_MODEL, prompt, max_tokens, temperature)
+        cache = get_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        # don't join a generation that started before the last cache invalidation
+        inflight_key = (key, cache.epoch)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(key, prompt, max_tokens, temperature))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _t, k=inflight_key: self._inflight.pop(k, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller giving up must not cancel the generation for the others
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": len(self._inflight),
+            "requests": self.requests,
+            "generations": self.generations,
+            "coalesced": self.coalesced,
+            "response_cache": get_cache().stats(),
+        }
+
+
+def get_loop():
+    """Background event loop shared by all sync callers."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ollama-async-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def get_client():
+    global _client
+    if _client is None:
+        with _loop_lock:
+            if _client is None:
+                _client = AsyncOllamaClient()
+    return _client
+
+async def generate(prompt, max_tokens=512, temperature=0.3):
+    """Async entry point for code already running on the background loop."""
+    return await get_client().generate(prompt, max_tokens=max_tokens, temperature=temperature)
+
+def call_local_llama(prompt, max_tokens=512, temperature=0.3, stream=False, timeout=None):
+    """
+    Drop-in sync replacement for llama_local.call_local_llama that goes
+    through the response cache, the concurrency limit and in-flight
+    coalescing. Streaming calls are passed straight to llama_local.
+    timeout (seconds, default connect + read timeout) bounds the wait,
+    including time queued behind the concurrency limit; the generation
+    itself keeps running for any other caller sharing it.
+    """
+    if stream:
+        return stream_local_llama(prompt, max_tokens=max_tokens, temperature=temperature)
+    fut = asyncio.run_coroutine_threadsafe(
+        get_client().generate(prompt, max_tokens=max_tokens, temperature=temperature),
+        get_loop()
+    )
+    if timeout is None:
+        timeout = OLLAMA_CONNECT_TIMEOUT + OLLAMA_READ_TIMEOUT
+    try:
+        return fut.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()
+        return f"[Error calling Ollama: no response within {timeout:g}s]"
+
+def llama_stats():
+    return get_client().stats()
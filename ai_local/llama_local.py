@@ -2,39 +2,101 @@
 # Helper to call local Ollama server
 
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import os
 import json
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_ENDPOINT = f"{OLLAMA_HOST}/api/generate"
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")  # change if different
+# Keep-alive connection pool shared by all calls
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
 
-def call_local_llama(prompt, max_tokens=512, temperature=0.3, stream=False):
-    """
-    Calls Ollama local REST API. Returns text response.
-    """
-    payload = {
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the pooled keep-alive session used for every Ollama request."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+def _payload(prompt, max_tokens, temperature, stream):
+    return {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
         "max_tokens": max_tokens,
         "temperature": temperature,
         "stream": stream
     }
+
+def _extract_text(data):
+    # Ollama may return different JSON shapes based on version. We'll check known keys.
+    # Common: data["choices"][0]["message"]["content"] or data.get("response")
+    if "response" in data:
+        return data["response"]
+    choices = data.get("choices", [])
+    if choices:
+        c = choices[0]
+        msg = c.get("message") or c.get("text") or c.get("delta")
+        if isinstance(msg, dict):
+            return msg.get("content", "")
+        return msg or ""
+    return None
+
+def stream_local_llama(prompt, max_tokens=512, temperature=0.3):
+    """
+    Calls Ollama with stream=true and yields text fragments as they arrive.
+    Errors are yielded as a final "[Error calling Ollama: ...]" fragment.
+    """
+    try:
+        with get_session().post(
+            OLLAMA_ENDPOINT,
+            json=_payload(prompt, max_tokens, temperature, True),
+            timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+            stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                text = _extract_text(data)
+                if text:
+                    yield text
+                if data.get("done"):
+                    break
+    except Exception as e:
+        yield f"[Error calling Ollama: {str(e)}]"
+
+def call_local_llama(prompt, max_tokens=512, temperature=0.3, stream=False):
+    """
+    Calls Ollama local REST API. Returns text response, or a generator of
+    text fragments when stream=True.
+    """
+    if stream:
+        return stream_local_llama(prompt, max_tokens=max_tokens, temperature=temperature)
     try:
-        resp = requests.post(OLLAMA_ENDPOINT, json=payload, timeout=120)
+        resp = get_session().post(
+            OLLAMA_ENDPOINT,
+            json=_payload(prompt, max_tokens, temperature, False),
+            timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+        )
         resp.raise_for_status()
         data = resp.json()
-        # Ollama may return different JSON shapes based on version. We'll check known keys.
-        # Common: data["choices"][0]["message"]["content"] or data.get("response")
-        if "response" in data:
-            return data["response"]
-        choices = data.get("choices", [])
-        if choices:
-            c = choices[0]
-            msg = c.get("message") or c.get("text")
-            if isinstance(msg, dict):
-                return msg.get("content", "")
-            return msg or ""
+        text = _extract_text(data)
+        if text is not None:
+            return text
         # fallback
         return json.dumps(data)
     except Exception as e:
@@ -0,0 +1,103 @@
+# llm_cache_local.py
+# Response cache for local LLM calls, keyed by model, sampling params and normalized prompt hash
+
+from collections import OrderedDict
+import threading
+import hashlib
+import time
+import re
+import os
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds; 0 disables the cache
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so re-indented or re-wrapped prompts share an entry."""
+    return _WS.sub(" ", prompt).strip()
+
+
+def prompt_key(model, prompt, max_tokens, temperature):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return (model, max_tokens, float(temperature), digest)
+
+
+class ResponseCache:
+    """
+    LRU of generated texts with a TTL. invalidate() drops everything, and is
+    wired to writes on the data the prompts are built from.
+    """
+
+    def __init__(self, ttl=LLM_CACHE_TTL, max_items=LLM_CACHE_SIZE):
+        self.ttl = float(ttl)
+        self.max_items = max(0, int(max_items))
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # bumped by invalidate(); results computed before a bump are not stored
+        self.epoch = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_items > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, text, epoch=None):
+        if not self.enabled or not text or text.startswith("[Error calling Ollama"):
+            return
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+            self.epoch += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def invalidate_llm_cache():
+    """Invalidation hook: call after writes to the data LLM prompts summarize."""
+    get_cache().invalidate()
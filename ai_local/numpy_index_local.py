@@ -0,0 +1,310 @@
+# numpy_index_local.py
+# Exact in-process vector index: one contiguous float32 matrix per employee, memory-mapped from disk
+#
+# Layout under NUMPY_INDEX_DIR/<collection>/:
+#   meta.json                 {"dim": N}
+#   <employee>/vectors.f32    row-major float32 rows (np.memmap)
+#   <employee>/rows.jsonl     one {"id", "document", "metadata"} per row, same order
+
+from .vectorstore_local import VectorBackend
+import numpy as np
+import threading
+import json
+import os
+
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./vector_index")
+
+_SHARED_PARTITION = "_shared"
+
+
+def _safe_name(value):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(value)) or _SHARED_PARTITION
+
+
+class _Partition:
+    """All chunks of one employee: a float32 matrix plus parallel id/doc/metadata lists."""
+
+    def __init__(self, directory, dim):
+        self.dir = directory
+        self.dim = dim
+        self.vec_path = os.path.join(directory, "vectors.f32")
+        self.rows_path = os.path.join(directory, "rows.jsonl")
+        self.ids, self.docs, self.metas = [], [], []
+        self.row_of = {}
+        self._mat = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.rows_path) or not os.path.exists(self.vec_path):
+            return
+        complete = os.path.getsize(self.vec_path) // (self.dim * 4)
+        with open(self.rows_path) as f:
+            for line in f:
+                if len(self.ids) >= complete:
+                    break
+                row = json.loads(line)
+                self.row_of[row["id"]] = len(self.ids)
+                self.ids.append(row["id"])
+                self.docs.append(row["document"])
+                self.metas.append(row["metadata"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matrix(self):
+        if not self.ids:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._mat is None or self._mat.shape[0] != len(self.ids):
+            self._mat = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        return self._mat
+
+    def upsert(self, ids, docs, embs, metas):
+        os.makedirs(self.dir, exist_ok=True)
+        embs = np.asarray(embs, dtype=np.float32).reshape(-1, self.dim)
+        new, updated = [], []
+        for i, (cid, doc, md) in enumerate(zip(ids, docs, metas)):
+            (updated if cid in self.row_of else new).append((i, cid, doc, md))
+
+        if updated:
+            # rare with content-addressed ids: patch rows in place, rewrite the row file
+            self._mat = None
+            mat = np.memmap(self.vec_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+            for i, cid, doc, md in updated:
+                r = self.row_of[cid]
+                mat[r] = embs[i]
+                self.docs[r], self.metas[r] = doc, md
+            mat.flush()
+            del mat
+            self._rewrite_rows()
+
+        if new:
+            # vectors first, so a crash never leaves a row entry without its vector
+            with open(self.vec_path, "ab") as f:
+                f.write(np.ascontiguousarray(embs[[i for i, *_ in new]]).tobytes())
+            with open(self.rows_path, "a") as f:
+                for _, cid, doc, md in new:
+                    f.write(json.dumps({"id": cid, "document": doc, "metadata": md}) + "\n")
+            for _, cid, doc, md in new:
+                self.row_of[cid] = len(self.ids)
+                self.ids.append(cid)
+                self.docs.append(doc)
+                self.metas.append(md)
+
+    def remove(self, ids):
+        """Drop rows by id (an id that moved to another employee's partition); rewrites both files."""
+        drop = {self.row_of[cid] for cid in ids if cid in self.row_of}
+        if not drop:
+            return
+        keep = [r for r in range(len(self.ids)) if r not in drop]
+        mat = np.array(self.matrix()[keep], dtype=np.float32)
+        self._mat = None
+        tmp = self.vec_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(mat.tobytes())
+        os.replace(tmp, self.vec_path)
+        self.ids = [self.ids[r] for r in keep]
+        self.docs = [self.docs[r] for r in keep]
+        self.metas = [self.metas[r] for r in keep]
+        self.row_of = {cid: r for r, cid in enumerate(self.ids)}
+        self._rewrite_rows()
+
+    def _rewrite_rows(self):
+        tmp = self.rows_path + ".tmp"
+        with open(tmp, "w") as f:
+            for cid, doc, md in zip(self.ids, self.docs, self.metas):
+                f.write(json.dumps({"id": cid, "document": doc, "metadata": md}) + "\n")
+        os.replace(tmp, self.rows_path)
+
+
+class _Collection:
+    def __init__(self, directory):
+        self.dir = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.dim = None
+        self.partitions = {}
+        self.id_partition = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            for name in sorted(os.listdir(directory)):
+                if os.path.isdir(os.path.join(directory, name)):
+                    self._open(name)
+
+    def _open(self, name):
+        part = _Partition(os.path.join(self.dir, name), self.dim)
+        self.partitions[name] = part
+        for cid in part.ids:
+            self.id_partition[cid] = name
+        return part
+
+    def partition(self, name, create=False):
+        part = self.partitions.get(name)
+        if part is None and create:
+            part = self._open(name)
+        return part
+
+    def set_dim(self, dim):
+        if self.dim is None:
+            os.makedirs(self.dir, exist_ok=True)
+            self.dim = int(dim)
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+        elif self.dim != int(dim):
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self.dim}")
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact top-k search with a dot product against one employee's matrix and
+    np.argpartition. Embeddings are expected L2-normalised (as embed_texts
+    returns them); distances are reported as squared L2 like Chroma's default.
+    """
+
+    name = "numpy"
+
+    def __init__(self, root=NUMPY_INDEX_DIR):
+        self.root = root
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def _collection(self, name):
+        coll = self._collections.get(name)
+        if coll is None:
+            coll = self._collections[name] = _Collection(os.path.join(self.root, _safe_name(name)))
+        return coll
+
+    def upsert(self, collection, ids, documents, embeddings, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            coll = self._collection(collection)
+            coll.set_dim(embeddings.shape[1])
+            groups = {}
+            for i, md in enumerate(metadatas):
+                key = _safe_name((md or {}).get("employee_id", _SHARED_PARTITION))
+                groups.setdefault(key, []).append(i)
+            for key, rows in groups.items():
+                part = coll.partition(key, create=True)
+                part.upsert([ids[i] for i in rows], [documents[i] for i in rows],
+                            embeddings[rows], [metadatas[i] for i in rows])
+                # an id whose employee_id changed leaves its old partition (after
+                # the new row is written, so a crash duplicates rather than loses it)
+                moved = {}
+                for i in rows:
+                    old = coll.id_partition.get(ids[i])
+                    if old is not None and old != key:
+                        moved.setdefault(old, []).append(ids[i])
+                    coll.id_partition[ids[i]] = key
+                for old, moved_ids in moved.items():
+                    coll.partition(old).remove(moved_ids)
+
+    def get_ids(self, collection, ids):
+        with self._lock:
+            coll = self._collection(collection)
+            return {i for i in ids if i in coll.id_partition}
+
+    def query(self, collection, query_embeddings, n_results=5, where=None):
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        if q.ndim == 1:
+            q = q[None, :]
+        where = dict(where or {})
+        with self._lock:
+            coll = self._collection(collection)
+            if "employee_id" in where:
+                part = coll.partition(_safe_name(where.pop("employee_id")))
+                parts = [part] if part is not None else []
+            else:
+                parts = list(coll.partitions.values())
+            for k, v in where.items():
+                if k.startswith("$") or isinstance(v, dict):
+                    raise ValueError("numpy backend supports plain equality filters only")
+
+            mats, refs = [], []
+            for part in parts:
+                if not len(part):
+                    continue
+                mat = part.matrix()
+                if where:
+                    rows = [r for r, md in enumerate(part.metas) if all(md.get(k) == v for k, v in where.items())]
+                    if not rows:
+                        continue
+                    mat = mat[rows]
+                else:
+                    rows = range(len(part))
+                mats.append(mat)
+                refs.extend((part, r) for r in rows)
+
+        if not mats:
+            return _empty_result(len(q))
+        mat = mats[0] if len(mats) == 1 else np.concatenate(mats)
+        scores = np.asarray(mat @ q.T).T  # (n_queries, n_rows)
+        out = _empty_result(0)
+        for row in scores:
+            _append_top(out, row, n_results, refs)
+        return out
+
+    def query_many(self, collection, requests, n_results=5):
+        """
+        Requests filtered by employee_id alone are scored together: their
+        partitions are stacked into one matrix, every query vector is scored
+        against it in a single matmul, and each query takes its top-k from its
+        own employee's slice of columns. Other filters go through query().
+        """
+        results = [None] * len(requests)
+        batch = []  # (request index, partition, queries)
+        with self._lock:
+            coll = self._collection(collection)
+            for i, (where, q) in enumerate(requests):
+                employee_id = (where or {}).get("employee_id")
+                if set(where or {}) != {"employee_id"} or isinstance(employee_id, dict):
+                    continue
+                q = np.asarray(q, dtype=np.float32)
+                q = q[None, :] if q.ndim == 1 else q
+                part = coll.partition(_safe_name(employee_id))
+                if part is None or not len(part):
+                    results[i] = _empty_result(len(q))
+                else:
+                    batch.append((i, part, q))
+            span, mats, start = {}, [], 0  # partition -> (first column, end column)
+            for _, part, _ in batch:
+                if part not in span:
+                    # sized from the matrix taken under the lock; a later upsert may grow part
+                    mats.append(part.matrix())
+                    span[part] = (start, start + mats[-1].shape[0])
+                    start += mats[-1].shape[0]
+
+        if batch:
+            mat = mats[0] if len(mats) == 1 else np.concatenate(mats)
+            queries = np.concatenate([q for _, _, q in batch])
+            scores = np.asarray(queries @ mat.T)  # (all queries, all stacked rows)
+            row = 0
+            for i, part, q in batch:
+                first, end = span[part]
+                out = results[i] = _empty_result(0)
+                refs = [(part, r) for r in range(end - first)]
+                for _ in range(len(q)):
+                    _append_top(out, scores[row, first:end], n_results, refs)
+                    row += 1
+        return [
+            res if res is not None else self.query(collection, q, n_results=n_results, where=where)
+            for res, (where, q) in zip(results, requests)
+        ]
+
+
+def _empty_result(n_queries):
+    return {key: [[] for _ in range(n_queries)] for key in ("ids", "documents", "metadatas", "distances")}
+
+
+def _append_top(out, row, n_results, refs):
+    """Append one query's top n_results of row (scores aligned with refs) to out, best first."""
+    k = min(n_results, len(row))
+    if k <= 0:
+        for key in ("ids", "documents", "metadatas", "distances"):
+            out[key].append([])
+        return
+    top = np.argpartition(-row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+    top = top[np.argsort(-row[top])]
+    hits = [refs[t] for t in top]
+    out["ids"].append([p.ids[r] for p, r in hits])
+    out["documents"].append([p.docs[r] for p, r in hits])
+    out["metadatas"].append([p.metas[r] for p, r in hits])
+    out["distances"].append([float(2 - 2 * row[t]) for t in top])
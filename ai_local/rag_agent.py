@@ -1,8 +1,9 @@
 # rag_agent.py
 # RAG orchestration: retrieve relevant docs, form prompt, call local LLaMA
 
-from .vectorstore_local import query
-from .llama_local import call_local_llama
+from .vectorstore_local import query, query_many
+from .llama_local import stream_local_llama
+from .llama_async_local import call_local_llama
 from .embeddings_local import embed_texts
 import json
 
@@ -40,18 +41,19 @@ Instructions:
     return prompt
 
 
-def retrieve_for_employee(employee_id, question_text, top_k=5):
+def retrieve_for_employee(employee_id, question_text, top_k=5, collection=None):
     """
     Create embedding for the question, and search in Chroma for similar docs for that employee.
     """
-    # Convert the question into an embedding
-    query_vector = embed_texts([question_text])[0]
+    # Convert the question into an embedding (1 x dim float32 matrix)
+    query_vectors = embed_texts([question_text])
 
     # Query vector DB for matching docs of this employee
     res = query(
-        query_embeddings=[query_vector],
+        query_embeddings=query_vectors,
         n_results=top_k,
-        filter={"employee_id": str(employee_id)}
+        filter={"employee_id": str(employee_id)},
+        collection=collection
     )
 
     docs = []
@@ -63,8 +65,52 @@ def retrieve_for_employee(employee_id, question_text, top_k=5):
     return docs
 
 
-def ask(employee_meta, employee_id, question, top_k=5):
-    docs = retrieve_for_employee(employee_id, question, top_k=top_k)
+def retrieve_for_employees(pairs, top_k=5, collection=None):
+    """
+    Batched retrieval for many (employee_id, question) pairs, e.g. a
+    manager's whole team. All unique questions are embedded in one call and
+    the searches for every employee run together through query_many()
+    (one stacked matmul for the numpy backend, one $in query for Chroma).
+    Returns {employee_id: {question: [(doc_text, meta), ...]}}.
+    """
+    pairs = [(str(e), q) for e, q in pairs]
+    if not pairs:
+        return {}
+    questions = list(dict.fromkeys(q for _, q in pairs))
+    vectors = embed_texts(questions)
+    row_of = {q: i for i, q in enumerate(questions)}
+
+    per_employee = {}
+    for employee_id, q in pairs:
+        qs = per_employee.setdefault(employee_id, [])
+        if q not in qs:
+            qs.append(q)
+    requests = [
+        ({"employee_id": employee_id}, vectors[[row_of[q] for q in qs]])
+        for employee_id, qs in per_employee.items()
+    ]
+    results = query_many(requests, n_results=top_k, collection=collection)
+
+    grouped = {}
+    for (employee_id, qs), res in zip(per_employee.items(), results):
+        documents = res.get("documents") or []
+        metadatas = res.get("metadatas") or []
+        grouped[employee_id] = {
+            q: list(zip(documents[i], metadatas[i])) if i < len(documents) else []
+            for i, q in enumerate(qs)
+        }
+    return grouped
+
+
+def ask(employee_meta, employee_id, question, top_k=5, collection=None):
+    docs = retrieve_for_employee(employee_id, question, top_k=top_k, collection=collection)
     prompt = build_prompt(employee_meta, docs, question)
     answer = call_local_llama(prompt)
     return answer
+
+
+def ask_stream(employee_meta, employee_id, question, top_k=5, collection=None):
+    """Same as ask(), but yields the answer in fragments as the model produces them."""
+    docs = retrieve_for_employee(employee_id, question, top_k=top_k, collection=collection)
+    prompt = build_prompt(employee_meta, docs, question)
+    yield from stream_local_llama(prompt)
@@ -1,56 +1,340 @@
 # vectorstore_local.py
-# Compatible with new Chroma client API (2024+)
+# Vector store facade: add_documents/query over a pluggable backend.
+# Chroma backend is compatible with new Chroma client API (2024+)
 
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import atexit
+import logging
+import threading
+import numpy as np
 
 CHROMA_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+DEFAULT_COLLECTION = os.getenv("CHROMA_COLLECTION", "workwise_docs")
+# "chroma" (default) or "numpy" (exact per-employee matrices, see numpy_index_local.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Write-behind buffer: adds are flushed once this many are pending or after this long
+VECTOR_WRITE_BUFFER_SIZE = int(os.getenv("VECTOR_WRITE_BUFFER_SIZE", "256"))
+VECTOR_WRITE_FLUSH_MS = float(os.getenv("VECTOR_WRITE_FLUSH_MS", "1000"))
+
+logger = logging.getLogger(__name__)
 
 _client = None
-_collection = None
+_client_lock = threading.Lock()
+_collections = {}
+_collections_lock = threading.Lock()
+_buffer = None
+_buffer_lock = threading.Lock()
+_backend = None
+_backend_lock = threading.Lock()
 
 def get_client():
     """Create or return the Chroma persistent client."""
     global _client
     if _client is None:
-        # New API: PersistentClient replaces chromadb.Client(Settings(...))
-        from chromadb import PersistentClient
-        _client = PersistentClient(path=CHROMA_DIR)
+        with _client_lock:
+            if _client is None:
+                # New API: PersistentClient replaces chromadb.Client(Settings(...))
+                from chromadb import PersistentClient
+                _client = PersistentClient(path=CHROMA_DIR)
     return _client
 
-def get_collection(name="workwise_docs"):
-    """Return or create the main document collection."""
-    global _collection
-    client = get_client()
-    try:
-        _collection = client.get_collection(name)
-    except Exception:
-        _collection = client.create_collection(name)
-    return _collection
-
-def add_documents(doc_texts, embeddings, metadatas, ids=None):
-    """Add documents to collection."""
-    coll = get_collection()
+def get_collection(name=None):
+    """
+    Return the handle for a named collection (default: the main document
+    collection), creating it on first use. Handles are resolved once and
+    cached, so hot paths skip Chroma's metadata lookup.
+    """
+    name = name or DEFAULT_COLLECTION
+    coll = _collections.get(name)
+    if coll is None:
+        with _collections_lock:
+            coll = _collections.get(name)
+            if coll is None:
+                client = get_client()
+                try:
+                    coll = client.get_collection(name)
+                except Exception:
+                    coll = client.create_collection(name)
+                _collections[name] = coll
+    return coll
+
+def list_collections():
+    """Names of the collection handles resolved so far."""
+    return sorted(_collections)
+
+def forget_collection(name=None):
+    """Drop a cached handle, e.g. after the collection was deleted externally."""
+    with _collections_lock:
+        _collections.pop(name or DEFAULT_COLLECTION, None)
+
+class VectorBackend:
+    """
+    Storage/search interface behind add_documents/existing_ids/query.
+    Results use Chroma's shape: dict of per-query lists for ids, documents,
+    metadatas and distances.
+    """
+
+    name = "base"
+
+    def upsert(self, collection, ids, documents, embeddings, metadatas):
+        raise NotImplementedError
+
+    def get_ids(self, collection, ids):
+        """Subset of ids present in the collection."""
+        raise NotImplementedError
+
+    def query(self, collection, query_embeddings, n_results=5, where=None):
+        raise NotImplementedError
+
+    def query_many(self, collection, requests, n_results=5):
+        """
+        requests: list of (where, query_embeddings). Returns one result per
+        request. This default runs one search per request; ChromaBackend and
+        NumpyBackend batch the searches filtered by employee_id alone.
+        """
+        return [self.query(collection, q, n_results=n_results, where=where) for where, q in requests]
+
+    def close(self):
+        pass
+
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def upsert(self, collection, ids, documents, embeddings, metadatas):
+        get_collection(collection).upsert(
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    def get_ids(self, collection, ids):
+        res = get_collection(collection).get(ids=list(ids), include=[])
+        return set(res.get("ids", []))
+
+    def query(self, collection, query_embeddings, n_results=5, where=None):
+        return get_collection(collection).query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+
+    def query_many(self, collection, requests, n_results=5):
+        """
+        Requests filtered by employee_id alone go out as one query over all
+        their vectors with where={"employee_id": {"$in": [...]}}, and each
+        result row is split back per employee. A query left short of n_results
+        because the shared result was cut off is re-run on its own.
+        """
+        results = [None] * len(requests)
+        simple = [
+            i for i, (where, _) in enumerate(requests)
+            if set(where or {}) == {"employee_id"} and not isinstance(where["employee_id"], dict)
+        ]
+        if len(simple) > 1:
+            employees = [str(requests[i][0]["employee_id"]) for i in simple]
+            vectors = [np.atleast_2d(np.asarray(requests[i][1], dtype=np.float32)) for i in simple]
+            fetch = n_results * len(set(employees))
+            res = self.query(collection, np.concatenate(vectors), n_results=fetch,
+                             where={"employee_id": {"$in": sorted(set(employees))}})
+            row = 0
+            for i, employee_id, q in zip(simple, employees, vectors):
+                out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+                complete = True
+                for _ in range(len(q)):
+                    hits = [
+                        hit for hit in zip(res["ids"][row], res["documents"][row],
+                                           res["metadatas"][row], res["distances"][row])
+                        if str((hit[2] or {}).get("employee_id")) == employee_id
+                    ][:n_results]
+                    if len(hits) < n_results and len(res["ids"][row]) >= fetch:
+                        complete = False
+                    for key, values in zip(out, zip(*hits) if hits else ((), (), (), ())):
+                        out[key].append(list(values))
+                    row += 1
+                if complete:
+                    results[i] = out
+        return [
+            res if res is not None else self.query(collection, q, n_results=n_results, where=where)
+            for res, (where, q) in zip(results, requests)
+        ]
+
+    def close(self):
+        # legacy clients need an explicit persist()
+        if _client is not None and hasattr(_client, "persist"):
+            _client.persist()
+
+
+def get_backend():
+    """Return the configured backend (VECTOR_BACKEND), created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if VECTOR_BACKEND == "numpy":
+                    from .numpy_index_local import NumpyBackend
+                    _backend = NumpyBackend()
+                elif VECTOR_BACKEND == "chroma":
+                    _backend = ChromaBackend()
+                else:
+                    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+    return _backend
+
+class WriteBehindBuffer:
+    """
+    Collects upserts in memory and writes them with one upsert per collection
+    once max_items rows are pending, or every flush_ms otherwise.
+    Pending rows are keyed by (collection, id), so a later upsert of the same
+    id wins. flush() takes the rows out under the lock and writes them outside
+    it, so add() and lookups never wait on the backend; rows being written stay
+    visible to pending_ids()/pending_embeddings() until the write lands.
+    """
+
+    def __init__(self, max_items=VECTOR_WRITE_BUFFER_SIZE, flush_ms=VECTOR_WRITE_FLUSH_MS):
+        self.max_items = max(1, int(max_items))
+        self.flush_interval = max(0.0, float(flush_ms)) / 1000.0
+        self._pending = {}   # collection name -> {id: (document, embedding, metadata)}
+        self._inflight = {}  # collection name -> rows taken by a flush() still writing them
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # one writer at a time, so writes land in add() order
+        self._wake = threading.Condition(self._lock)
+        self._flusher = threading.Thread(target=self._run, name="vectorstore-flusher", daemon=True)
+        self._flusher.start()
+
+    def add(self, collection, doc_texts, embeddings, metadatas, ids):
+        with self._lock:
+            rows = self._pending.setdefault(collection, {})
+            for doc, emb, md, i in zip(doc_texts, embeddings, metadatas, ids):
+                rows[i] = (doc, emb, md)
+            if len(self) >= self.max_items:
+                self._wake.notify()
+
+    def pending_ids(self, collection, ids):
+        with self._lock:
+            rows = self._pending.get(collection, {})
+            inflight = self._inflight.get(collection, {})
+            return {i for i in ids if i in rows or i in inflight}
+
+    def pending_embeddings(self, collection, where=None):
+        """
+        Matrix of buffered rows (pending or being written) whose metadata
+        matches where (equality filters only), or None if there are none.
+        """
+        with self._lock:
+            rows = list(self._inflight.get(collection, {}).values()) + list(self._pending.get(collection, {}).values())
+        embs = [emb for _, emb, md in rows if all(md.get(k) == v for k, v in (where or {}).items())]
+        return np.asarray(embs, dtype=np.float32) if embs else None
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def flush(self, collection=None):
+        """Write pending rows (of one collection, or all) to the backend. Returns rows written."""
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                names = [collection] if collection else list(self._pending)
+            for name in names:
+                with self._lock:
+                    rows = self._pending.pop(name, None)
+                    if not rows:
+                        continue
+                    self._inflight[name] = rows
+                try:
+                    ids = list(rows)
+                    docs, embs, metas = zip(*rows.values())
+                    get_backend().upsert(name, ids, list(docs), np.asarray(embs, dtype=np.float32), list(metas))
+                except Exception:
+                    with self._lock:
+                        # put the rows back; anything re-added meanwhile is newer and wins
+                        rows.update(self._pending.get(name, {}))
+                        self._pending[name] = rows
+                    raise
+                finally:
+                    with self._lock:
+                        self._inflight.pop(name, None)
+                written += len(ids)
+        return written
+
+    def _run(self):
+        while True:
+            with self._wake:
+                self._wake.wait(timeout=self.flush_interval or None)
+            try:
+                self.flush()
+            except Exception:
+                # the rows were put back; the next tick or an explicit flush() retries
+                logger.exception("Vector store flush failed")
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer()
+    return _buffer
+
+def flush(collection=None):
+    """Write buffered documents (of one collection, or all) to the backend now."""
+    if _buffer is None:
+        return 0
+    return _buffer.flush(collection)
+
+def shutdown():
+    """Flush-on-shutdown hook."""
+    flush()
+    if _backend is not None:
+        _backend.close()
+
+atexit.register(shutdown)
+
+def add_documents(doc_texts, embeddings, metadatas, ids=None, collection=None):
+    """
+    Buffer documents for upsert (re-adding an id overwrites it). Returns
+    immediately; rows reach the collection on the next flush.
+    """
     if ids is None:
         ids = [f"doc_{i}" for i in range(len(doc_texts))]
-    coll.add(
-        documents=doc_texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
-    # Persist to disk
-    client = get_client()
-    if hasattr(client, "persist"):
-        client.persist()
-
-def query(query_embeddings, n_results=5, filter=None):
-    """Query the collection for similar documents."""
-    coll = get_collection()
-    res = coll.query(
-        query_embeddings=query_embeddings,
-        n_results=n_results,
-        where=filter
-    )
-    return res
+    get_buffer().add(collection or DEFAULT_COLLECTION, doc_texts, embeddings, metadatas, ids)
+
+def existing_ids(ids, collection=None):
+    """Return the subset of ids already stored in the collection."""
+    if not ids:
+        return set()
+    collection = collection or DEFAULT_COLLECTION
+    found = get_buffer().pending_ids(collection, ids)
+    rest = [i for i in ids if i not in found]
+    if rest:
+        found.update(get_backend().get_ids(collection, rest))
+    return found
+
+def buffered_embeddings(filter=None, collection=None):
+    """Embeddings of rows still in the write buffer matching filter (equality only), or None."""
+    if _buffer is None:
+        return None
+    return _buffer.pending_embeddings(collection or DEFAULT_COLLECTION, filter)
+
+def query(query_embeddings, n_results=5, filter=None, include=None, collection=None, flush_buffer=True):
+    """
+    Query the collection for similar documents. include is accepted for
+    Chroma compatibility; documents, metadatas and distances are always returned.
+    flush_buffer=False searches only what the backend already holds (check
+    buffered_embeddings() for the rest) instead of writing buffered rows first.
+    """
+    collection = collection or DEFAULT_COLLECTION
+    if flush_buffer:
+        # read-your-writes: buffered rows must be visible to the search
+        flush(collection)
+    return get_backend().query(collection, query_embeddings, n_results=n_results, where=filter)
+
+def query_many(requests, n_results=5, collection=None):
+    """
+    Run several filtered searches in one go.
+    requests: list of (filter, query_embeddings); returns results in the same order.
+    """
+    collection = collection or DEFAULT_COLLECTION
+    flush(collection)
+    return get_backend().query_many(collection, requests, n_results=n_results)
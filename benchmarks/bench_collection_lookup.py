@@ -0,0 +1,74 @@
+# bench_collection_lookup.py
+# Query latency with per-call collection resolution (old behaviour) vs the cached handle.
+#
+# Usage: python -m benchmarks.bench_collection_lookup [--docs 2000] [--queries 500]
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from chromadb import PersistentClient
+
+DIM = 384
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        client = PersistentClient(path=tmp)
+        coll = client.create_collection("bench_docs")
+        embs = rng.standard_normal((args.docs, DIM)).astype(np.float32)
+        embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+        for start in range(0, args.docs, 1000):
+            end = min(start + 1000, args.docs)
+            coll.add(
+                ids=[f"d{i}" for i in range(start, end)],
+                embeddings=embs[start:end],
+                documents=[f"doc {i}" for i in range(start, end)],
+                metadatas=[{"employee_id": str(i % args.employees)} for i in range(start, end)],
+            )
+        q = embs[:1]
+        where = {"employee_id": "7"}
+
+        def resolve_each_time():
+            try:
+                c = client.get_collection("bench_docs")
+            except Exception:
+                c = client.create_collection("bench_docs")
+            c.query(query_embeddings=q, n_results=5, where=where)
+
+        cached = client.get_collection("bench_docs")
+
+        def cached_handle():
+            cached.query(query_embeddings=q, n_results=5, where=where)
+
+        timed(cached_handle, 20)  # warm up
+        before = timed(resolve_each_time, args.queries)
+        after = timed(cached_handle, args.queries)
+
+    print(f"{'variant':>22} | {'mean ms':>8} | {'p95 ms':>8}")
+    print("-" * 44)
+    print(f"{'get_collection/query':>22} | {before[0]:>8.3f} | {before[1]:>8.3f}")
+    print(f"{'cached handle':>22} | {after[0]:>8.3f} | {after[1]:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
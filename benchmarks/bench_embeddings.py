@@ -0,0 +1,47 @@
+# bench_embeddings.py
+# Throughput of the micro-batching embedder versus max batch size.
+#
+# Usage: python -m benchmarks.bench_embeddings [--callers 32] [--requests 512]
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_local.embeddings_local import EmbeddingBatcher, _encode, get_model
+
+SAMPLE = (
+    "Shipped the new onboarding flow and paired with two juniors on code review. "
+    "Closed 14 tickets this sprint and improved the CI pipeline runtime."
+)
+
+
+def run(batch_size, callers, n_requests, wait_ms):
+    batcher = EmbeddingBatcher(encode_fn=_encode, max_batch_size=batch_size, max_wait_ms=wait_ms)
+    texts = [f"{SAMPLE} #{i}" for i in range(n_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(lambda t: batcher.embed([t]), texts))
+    elapsed = time.perf_counter() - start
+    return n_requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    parser.add_argument("--sizes", default="1,4,16,32,64,128")
+    args = parser.parse_args()
+
+    get_model()  # load weights outside the timed region
+    _encode(["warmup"])
+
+    print(f"{'batch_size':>10} | {'texts/sec':>10}")
+    print("-" * 24)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        tps = run(size, args.callers, args.requests, args.wait_ms)
+        print(f"{size:>10} | {tps:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
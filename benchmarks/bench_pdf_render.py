@@ -0,0 +1,73 @@
+# bench_pdf_render.py
+# PDFs per minute for a burst of reports: one conversion at a time, every
+# conversion at once (what concurrent requests did before the renderer bounded
+# them) and the bounded renderer at several worker counts. Each conversion is
+# one wkhtmltopdf process in every mode, so this measures the effect of the
+# concurrency limit, not of process reuse.
+#
+# Needs wkhtmltopdf (on PATH or WKHTMLTOPDF_PATH).
+# Usage: python -m benchmarks.bench_pdf_render [--reports 24] [--workers 1 2 4]
+
+import argparse
+import os
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+from reports_local.pdf_bounded_local import PdfRenderer, find_wkhtmltopdf
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+def sample_reports(n):
+    template = Environment(loader=FileSystemLoader(TEMPLATES)).get_template("ai_report_template.html")
+    return [
+        template.render(
+            date="2025-01-01 09:00 UTC",
+            total_employees=40 + i,
+            avg_performance=78.5,
+            completed_goals=120,
+            pending_goals=35,
+            feedback_count=310,
+            top_performers=[{"name": f"Employee {i}-{k}", "score": 95 - k} for k in range(5)],
+            insights="Key Observations<br>" + "Steady quarter-over-quarter improvement.<br>" * 20,
+            fallback_summary="",
+        )
+        for i in range(n)
+    ]
+
+
+def render_burst(htmls, workers):
+    renderer = PdfRenderer(find_wkhtmltopdf(), workers=workers)
+    try:
+        start = time.perf_counter()
+        results = renderer.render_many(htmls)
+        elapsed = time.perf_counter() - start
+    finally:
+        renderer.shutdown()
+    failed = sum(isinstance(r, Exception) for r in results)
+    if failed:
+        print(f"  ({failed} renders failed with workers={workers})")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    htmls = sample_reports(args.reports)
+    render_burst(htmls[:1], 1)  # warm up (fonts, page cache)
+
+    print(f"{args.reports} AI reports via {find_wkhtmltopdf()}")
+    print(f"{'mode':>14} | {'sec':>7} | {'PDFs/min':>9}")
+    print("-" * 36)
+    modes = [("serial", 1), ("unbounded", len(htmls))] + [(f"bounded x{w}", w) for w in args.workers if w > 1]
+    for name, workers in modes:
+        elapsed = render_burst(htmls, workers)
+        print(f"{name:>14} | {elapsed:>7.2f} | {args.reports / elapsed * 60:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
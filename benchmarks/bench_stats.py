@@ -0,0 +1,126 @@
+# bench_stats.py
+# Company stats: loading every Employee/Goal/Feedback row into Python vs the SQL aggregate snapshot.
+#
+# Uses a throwaway SQLite file with the same columns the app's models aggregate over.
+# Usage: python -m benchmarks.bench_stats [--employees 100000] [--goals-per 3] [--feedback-per 2]
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, create_engine, insert
+from sqlalchemy.orm import declarative_base, Session
+
+from reports_local.stats_local import snapshot
+
+Base = declarative_base()
+
+
+class Employee(Base):
+    __tablename__ = "employees"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    user_id = Column(Integer, unique=True)
+    manager_id = Column(Integer)
+    performance_score = Column(Integer, default=75)
+    review = Column(Text)
+
+
+class Goal(Base):
+    __tablename__ = "goal"
+    id = Column(Integer, primary_key=True)
+    title = Column(String(100))
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    status = Column(String(50))
+
+
+class Feedback(Base):
+    __tablename__ = "feedback"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    giver_id = Column(Integer, nullable=False)
+    comment = Column(Text, nullable=False)
+
+
+def populate(engine, employees, goals_per, feedback_per):
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(insert(Employee), [
+            {"id": i, "name": f"Employee {i}", "user_id": 1000 + i, "manager_id": 1 + i % 50,
+             "performance_score": rng.randint(40, 100), "review": "Solid quarter."}
+            for i in range(1, employees + 1)
+        ])
+        conn.execute(insert(Goal), [
+            {"title": "Goal", "employee_id": 1 + i % employees,
+             "status": rng.choice(["Completed", "In Progress", "Not Started"])}
+            for i in range(employees * goals_per)
+        ])
+        conn.execute(insert(Feedback), [
+            {"user_id": 1000 + 1 + i % employees, "giver_id": 1, "comment": "Great work on the release."}
+            for i in range(employees * feedback_per)
+        ])
+
+
+def python_stats(session):
+    # what the insights/report endpoints used to do
+    employees = session.query(Employee).all()
+    goals = session.query(Goal).all()
+    feedbacks = session.query(Feedback).all()
+    total = len(employees)
+    avg = round(sum(e.performance_score for e in employees) / total, 2) if total else 0
+    completed = sum(1 for g in goals if g.status.lower() == "completed")
+    top = sorted(employees, key=lambda e: e.performance_score, reverse=True)[:5]
+    return total, avg, completed, len(goals) - completed, len(feedbacks), [(e.name, e.performance_score) for e in top]
+
+
+def sql_stats(session):
+    return snapshot(session, Employee, Goal, Feedback)
+
+
+def timed(engine, fn, runs):
+    samples = []
+    for _ in range(runs):
+        with Session(engine) as session:  # fresh session: no identity-map reuse between runs
+            start = time.perf_counter()
+            fn(session)
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=100_000)
+    parser.add_argument("--goals-per", type=int, default=3)
+    parser.add_argument("--feedback-per", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        populate(engine, args.employees, args.goals_per, args.feedback_per)
+
+        with Session(engine) as session:
+            snap = sql_stats(session)
+            legacy = python_stats(session)
+        assert (snap.total_employees, snap.avg_performance, snap.completed_goals,
+                snap.pending_goals, snap.feedback_count) == legacy[:5], (snap, legacy[:5])
+
+        py = timed(engine, python_stats, args.runs)
+        sql = timed(engine, sql_stats, args.runs)
+        engine.dispose()
+
+    print(f"{args.employees} employees, {args.employees * args.goals_per} goals, "
+          f"{args.employees * args.feedback_per} feedback rows (median of {args.runs})")
+    print(f"{'method':>14} | {'ms':>9}")
+    print("-" * 27)
+    print(f"{'load all rows':>14} | {py * 1000:>9.1f}")
+    print(f"{'SQL snapshot':>14} | {sql * 1000:>9.1f}")
+    print(f"speedup: {py / sql:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench_vector_backends.py
+# Per-employee top-k latency: Chroma backend vs the NumPy matrix backend.
+#
+# Usage: python -m benchmarks.bench_vector_backends [--employees 200] [--chunks 300]
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+DIM = 384
+
+
+def populate(backend, embs, employees, chunks):
+    for e in range(employees):
+        rows = slice(e * chunks, (e + 1) * chunks)
+        backend.upsert(
+            "bench_docs",
+            [f"{e}_{i}" for i in range(chunks)],
+            [f"doc {e}/{i}" for i in range(chunks)],
+            embs[rows],
+            [{"employee_id": str(e), "source": "bench"} for _ in range(chunks)],
+        )
+
+
+def latency(backend, queries, employees):
+    samples = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        backend.query("bench_docs", q[None, :], n_results=5, where={"employee_id": str(i % employees)})
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=300, help="chunks per employee")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embs = rng.standard_normal((args.employees * args.chunks, DIM)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    queries = embs[rng.integers(0, len(embs), args.queries)]
+
+    from ai_local import vectorstore_local
+    from ai_local.numpy_index_local import NumpyBackend
+
+    results = {}
+    with tempfile.TemporaryDirectory() as chroma_dir, tempfile.TemporaryDirectory() as np_dir:
+        vectorstore_local.CHROMA_DIR = chroma_dir
+        for backend in (vectorstore_local.ChromaBackend(), NumpyBackend(root=np_dir)):
+            start = time.perf_counter()
+            populate(backend, embs, args.employees, args.chunks)
+            load = time.perf_counter() - start
+            latency(backend, queries[:20], args.employees)  # warm up
+            results[backend.name] = (load,) + latency(backend, queries, args.employees)
+
+    print(f"{args.employees} employees x {args.chunks} chunks, dim={DIM}, top-5 filtered by employee")
+    print(f"{'backend':>8} | {'load s':>8} | {'mean ms':>8} | {'p95 ms':>8}")
+    print("-" * 42)
+    for name, (load, mean, p95) in results.items():
+        print(f"{name:>8} | {load:>8.2f} | {mean:>8.3f} | {p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
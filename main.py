@@ -1,18 +1,26 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from datetime import datetime
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
+from datetime import datetime, timedelta, timezone
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import joinedload, contains_eager
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import requests
+import click
+import json
+import hashlib
+import threading
+import time
 from dotenv import load_dotenv
 load_dotenv()   # will read .env in project root
 
 # local ai imports
 from ai_local.ingest_local import ingest_text
-from ai_local.embeddings_local import embed_texts
+from ai_local.bulk_ingest_local import bulk_ingest
+from ai_local.embeddings_local import embed_texts, embedding_cache_stats
 from ai_local.vectorstore_local import query as chroma_query
-from ai_local.rag_agent import ask as rag_ask
+from ai_local.rag_agent import ask as rag_ask, ask_stream as rag_ask_stream, retrieve_for_employees
 
 # ==========================
 # AI CONFIGURATION
@@ -30,7 +38,8 @@ from ai_local.rag_agent import ask as rag_ask
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(BASE_DIR, 'workwise.db')}"
+DB_PATH = os.environ.get("WORKWISE_DB") or os.path.join(BASE_DIR, "workwise.db")
+app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{DB_PATH}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.jinja_env.globals.update(enumerate=enumerate)
 
@@ -38,42 +47,64 @@ app.jinja_env.globals.update(enumerate=enumerate)
 @app.route("/ai/ingest_local", methods=["POST"])
 def ai_ingest_local():
     """
-    POST JSON: { "employee_id": "...", "source": "...", "content": "...", "extra_meta": {...} }
+    POST JSON: { "employee_id": "...", "source": "...", "content": "...", "extra_meta": {...}, "collection": "..." }
     """
     payload = request.get_json() or {}
     employee_id = payload.get("employee_id")
     source = payload.get("source", "user_post")
     content = payload.get("content", "")
     extra = payload.get("extra_meta", {})
+    collection = payload.get("collection")
 
     if not employee_id or not content:
         return jsonify({"success": False, "message": "employee_id and content required"}), 400
 
     try:
-        num_chunks = ingest_text(employee_id=employee_id, source=source, text=content, extra_meta=extra)
+        num_chunks = ingest_text(employee_id=employee_id, source=source, text=content, extra_meta=extra,
+                                 collection=collection)
         return jsonify({"success": True, "stored_chunks": num_chunks})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-# Add route to ask AI via local LLaMA + RAG
-@app.route("/ai/suggest_local", methods=["GET","POST"])
-def ai_suggest_local():
+# Bulk ingest: NDJSON body, one {"employee_id", "source", "content", "extra_meta"} per line
+@app.route("/ai/ingest_bulk", methods=["POST"])
+def ai_ingest_bulk():
     """
-    GET params: employee_id, q (question)
-    POST JSON: { "employee_id": "...", "q": "..."}
+    POST application/x-ndjson. The body is consumed as a stream, so it is never
+    held in memory as a whole. Returns throughput stats.
     """
+    try:
+        stats = bulk_ingest(request.stream)
+        return jsonify({"success": True, **stats})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.cli.command("ingest-bulk")
+@click.argument("path", type=click.File("rb"), default="-")
+@click.option("--embed-workers", type=int, default=None, help="Parallel embedding workers.")
+def ingest_bulk_command(path, embed_workers):
+    """Bulk-ingest an NDJSON file (or stdin with '-') into the local vector store."""
+    kwargs = {"embed_workers": embed_workers} if embed_workers else {}
+    stats = bulk_ingest(path, **kwargs)
+    click.echo(
+        f"Ingested {stats['documents']} documents / {stats['chunks']} chunks "
+        f"({stats['stored_chunks']} stored, {stats['skipped_chunks']} duplicates) "
+        f"in {stats['elapsed_sec']}s: {stats['docs_per_sec']} docs/sec, {stats['chunks_per_sec']} chunks/sec"
+    )
+    for err in stats["errors"]:
+        click.echo(f"  error: {err}", err=True)
+
+def _suggest_params():
+    """(employee_id, question, collection) from GET params or POST JSON."""
     if request.method == "POST":
         payload = request.get_json() or {}
-        employee_id = payload.get("employee_id")
-        q = payload.get("q", "Give actionable suggestions")
-    else:
-        employee_id = request.args.get("employee_id")
-        q = request.args.get("q", "Give actionable suggestions")
+        return (payload.get("employee_id"), payload.get("q", "Give actionable suggestions"),
+                payload.get("collection"))
+    return (request.args.get("employee_id"), request.args.get("q", "Give actionable suggestions"),
+            request.args.get("collection"))
 
-    if not employee_id:
-        return jsonify({"success": False, "message": "employee_id required"}), 400
-
-    # Pull employee metadata from your SQLAlchemy models (modify as per your models)
+def _employee_meta(employee_id):
+    """Pull employee metadata from the SQLAlchemy models for the RAG prompt."""
     try:
         emp = Employee.query.get(employee_id)
         if not emp:
@@ -89,14 +120,107 @@ def ai_suggest_local():
             }
     except Exception:
         emp_meta = {"employee_id": str(employee_id)}
+    return emp_meta
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(fragments):
+    """Stream text fragments as Server-Sent Events: token* then done (or error)."""
+    def generate():
+        try:
+            for text in fragments:
+                yield _sse("token", {"text": text})
+            yield _sse("done", {})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Add route to ask AI via local LLaMA + RAG
+@app.route("/ai/suggest_local", methods=["GET","POST"])
+def ai_suggest_local():
+    """
+    GET params: employee_id, q (question), collection (optional)
+    POST JSON: { "employee_id": "...", "q": "...", "collection": "..."}
+    """
+    employee_id, q, collection = _suggest_params()
+    if not employee_id:
+        return jsonify({"success": False, "message": "employee_id required"}), 400
+    emp_meta = _employee_meta(employee_id)
 
     # Use rag_agent to process and get a JSON answer
     try:
-        raw_answer = rag_ask(employee_meta=emp_meta, employee_id=employee_id, question=q, top_k=5)
+        raw_answer = rag_ask(employee_meta=emp_meta, employee_id=employee_id, question=q, top_k=5,
+                             collection=collection)
         return jsonify({"success": True, "response": raw_answer})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/ai/suggest_local/stream", methods=["GET","POST"])
+def ai_suggest_local_stream():
+    """Streaming (SSE) variant of /ai/suggest_local: emits "token" events, then "done"."""
+    employee_id, q, collection = _suggest_params()
+    if not employee_id:
+        return jsonify({"success": False, "message": "employee_id required"}), 400
+    emp_meta = _employee_meta(employee_id)
+    return _sse_response(rag_ask_stream(employee_meta=emp_meta, employee_id=employee_id, question=q,
+                                        top_k=5, collection=collection))
+
+@app.route("/ai/retrieve_batch", methods=["POST"])
+def ai_retrieve_batch():
+    """
+    POST JSON: { "items": [{"employee_id": "...", "q": "..."}, ...], "top_k": 5, "collection": "..." }
+    Returns retrieved evidence grouped per employee and question.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "message": "JSON object body required"}), 400
+    items = payload.get("items") or []
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({"success": False, "message": "items must be a list of objects"}), 400
+    try:
+        top_k = int(payload.get("top_k", 5))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "top_k must be an integer"}), 400
+    if top_k < 1:
+        return jsonify({"success": False, "message": "top_k must be at least 1"}), 400
+    pairs = [
+        (item.get("employee_id"), item.get("q", "Give actionable suggestions"))
+        for item in items if item.get("employee_id")
+    ]
+    if not pairs:
+        return jsonify({"success": False, "message": "items with employee_id required"}), 400
+    if not all(isinstance(q, str) and isinstance(e, (str, int)) for e, q in pairs):
+        return jsonify({"success": False, "message": "employee_id must be a string or number and q a string"}), 400
+
+    try:
+        grouped = retrieve_for_employees(pairs, top_k=top_k, collection=payload.get("collection"))
+        results = {
+            employee_id: [
+                {"q": q, "documents": [{"text": d, "metadata": m} for d, m in docs]}
+                for q, docs in by_question.items()
+            ]
+            for employee_id, by_question in grouped.items()
+        }
+        return jsonify({"success": True, "results": results})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/ai/llm_stats", methods=["GET"])
+def ai_llm_stats():
+    """Concurrency and coalescing counters of the local LLM client."""
+    from ai_local.llama_async_local import llama_stats
+    return jsonify({"success": True, "stats": llama_stats()})
+
+@app.route("/ai/embedding_cache_stats", methods=["GET"])
+def ai_embedding_cache_stats():
+    """Hit/miss counters for the local embedding cache."""
+    return jsonify({"success": True, "stats": embedding_cache_stats()})
+
 @app.route("/ai/insights_local", methods=["GET"])
 def ai_insights_local():
     """
@@ -105,27 +229,16 @@ def ai_insights_local():
     """
     try:
         # Step 1 — Collect summary data (still useful for backend)
-        employees = Employee.query.all()
-        goals = Goal.query.all() if 'Goal' in globals() else []
-        feedbacks = Feedback.query.all() if 'Feedback' in globals() else []
-
-        total_employees = len(employees)
-        avg_performance = (
-            sum([getattr(e, "performance_score", 0) for e in employees]) / total_employees
-            if total_employees else 0
-        )
-        completed_goals = sum([1 for g in goals if getattr(g, "status", "").lower() == "completed"])
-        pending_goals = sum([1 for g in goals if getattr(g, "status", "").lower() != "completed"])
-        feedback_count = len(feedbacks)
+        stats = stats_snapshot()
 
         # Step 2 — (Backend data consistency, but no AI generation)
         _ = f"""
         Snapshot:
-        - Employees: {total_employees}
-        - Avg Performance: {avg_performance:.2f}
-        - Completed Goals: {completed_goals}
-        - Pending Goals: {pending_goals}
-        - Feedback Entries: {feedback_count}
+        - Employees: {stats.total_employees}
+        - Avg Performance: {stats.avg_performance:.2f}
+        - Completed Goals: {stats.completed_goals}
+        - Pending Goals: {stats.pending_goals}
+        - Feedback Entries: {stats.feedback_count}
         """
 
         # Step 3 — Return empty insights (disabling display)
@@ -137,39 +250,21 @@ def ai_insights_local():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route("/ai/insights_report", methods=["GET"])
-def ai_insights_report():
-    """
-    Dedicated AI insights endpoint for floating report and PDF generation.
-    """
-    try:
-        from ai_local.llama_local import call_local_llama
+def _insights_report_prompt():
+    """Build the company-wide insights prompt from summary data."""
+    # --- Collect summary data ---
+    stats = stats_snapshot()
 
-        # --- Collect summary data ---
-        employees = Employee.query.all()
-        goals = Goal.query.all() if 'Goal' in globals() else []
-        feedbacks = Feedback.query.all() if 'Feedback' in globals() else []
-
-        total_employees = len(employees)
-        avg_performance = (
-            sum([getattr(e, "performance_score", 0) for e in employees]) / total_employees
-            if total_employees else 0
-        )
-        completed_goals = sum(
-            [1 for g in goals if getattr(g, "status", "").lower() == "completed"]
-        )
-        feedback_count = len(feedbacks)
-
-        # --- Build AI prompt ---
-        summary_text = f"""
+    # --- Build AI prompt ---
+    summary_text = f"""
         Company Snapshot:
-        - Total Employees: {total_employees}
-        - Average Performance Score: {avg_performance:.2f}
-        - Completed Goals: {completed_goals}
-        - Total Feedback Entries: {feedback_count}
+        - Total Employees: {stats.total_employees}
+        - Average Performance Score: {stats.avg_performance:.2f}
+        - Completed Goals: {stats.completed_goals}
+        - Total Feedback Entries: {stats.feedback_count}
         """
 
-        prompt = f"""
+    prompt = f"""
         You are the WorkWise AI analyst. Analyze the company data and generate concise insights.
 
         Data Summary:
@@ -180,8 +275,17 @@ def ai_insights_report():
         - **Actionable Recommendations**
         - **Overall Sentiment**
         """
+    return prompt
 
-        insights = call_local_llama(prompt)
+@app.route("/ai/insights_report", methods=["GET"])
+def ai_insights_report():
+    """
+    Dedicated AI insights endpoint for floating report and PDF generation.
+    """
+    try:
+        from ai_local.llama_async_local import call_local_llama
+
+        insights = call_local_llama(_insights_report_prompt())
         if not insights:
             return jsonify({
                 "success": False,
@@ -195,6 +299,17 @@ def ai_insights_report():
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/ai/insights_report/stream", methods=["GET"])
+def ai_insights_report_stream():
+    """Streaming (SSE) variant of /ai/insights_report: emits "token" events, then "done"."""
+    from ai_local.llama_local import stream_local_llama
+
+    try:
+        prompt = _insights_report_prompt()
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    return _sse_response(stream_local_llama(prompt))
+
 
 # Initialize SQLAlchemy
 db = SQLAlchemy(app)
@@ -242,7 +357,6 @@ class Employee(db.Model):
     performance_score = db.Column(db.Integer, default=75)
     review = db.Column(db.Text)
     ai_summary = db.Column(db.String(500), default="")
-    recent_activities = db.Column(db.PickleType, default=[])
 
     # Fields for detailed metrics
     work_logs = db.Column(db.String(50))
@@ -253,6 +367,25 @@ class Employee(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Append-only; query it (e.g. recent_employee_activities()) rather than loading it whole
+    activities = db.relationship('EmployeeActivity', backref='employee', lazy='dynamic')
+
+
+class EmployeeActivity(db.Model):
+    __tablename__ = 'employee_activities'
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    action = db.Column(db.String(200), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+db.Index("ix_employee_activities_employee_time", EmployeeActivity.employee_id, EmployeeActivity.timestamp)
+
+
+# Ranking is served from the in-memory leaderboard, so employees needs no
+# score / commits indexes; team pages filter by manager
+db.Index("ix_employees_manager", Employee.manager_id)
+
 
 class Goal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -298,6 +431,349 @@ class Feedback(db.Model):
         }
 
 
+# Hot-path lookups: filter column(s) first, then the ORDER BY column
+db.Index("ix_goal_employee_status", Goal.employee_id, Goal.status)
+db.Index("ix_bonus_employee_month", Bonus.employee_id, Bonus.month)
+db.Index("ix_leadership_activity_manager_time", LeadershipActivity.manager_id, LeadershipActivity.timestamp)
+db.Index("ix_feedback_user_created", Feedback.user_id, Feedback.created_at)
+db.Index("ix_feedback_giver_created", Feedback.giver_id, Feedback.created_at)
+
+
+class PerformanceWeek(db.Model):
+    # One point per employee per week (week_start is the Monday); written through
+    # reports_local.timeseries_local.load(), read by the chart endpoints
+    __tablename__ = 'performance_weeks'
+    __table_args__ = {"sqlite_with_rowid": False}
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)
+    performance_score = db.Column(db.SmallInteger, nullable=False)
+    commits = db.Column(db.Integer, nullable=False, default=0)
+    goals_planned = db.Column(db.SmallInteger, nullable=False, default=0)
+    goals_completed = db.Column(db.SmallInteger, nullable=False, default=0)
+    # the employee's team that week; rollups count the point towards these
+    manager_id = db.Column(db.Integer)
+    department = db.Column(db.String(50))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class PerformanceRollup(db.Model):
+    # Sums of the performance_weeks points per manager / department and week / month,
+    # maintained by reports_local.rollups_local
+    __tablename__ = 'performance_rollups'
+    __table_args__ = {"sqlite_with_rowid": False}
+    scope = db.Column(db.String(10), primary_key=True)       # manager | department
+    scope_key = db.Column(db.String(50), primary_key=True)   # manager id or department name
+    period = db.Column(db.String(5), primary_key=True)       # week | month
+    period_start = db.Column(db.Date, primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    commits_sum = db.Column(db.Integer, nullable=False, default=0)
+    goals_planned = db.Column(db.Integer, nullable=False, default=0)
+    goals_completed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ==========================
+# WRITE HOOKS
+# ==========================
+# Callbacks run after a commit that inserted, updated or deleted rows of the
+# given models (cache invalidation etc.). Register with on_model_write();
+# with_ids=True passes {model: set of primary keys written}. The session can't
+# emit SQL inside after_commit, so callbacks that read use their own connection.
+_write_listeners = []
+
+
+def on_model_write(models, callback, with_ids=False):
+    _write_listeners.append((tuple(models), callback, with_ids))
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_written_models(session, flush_context):
+    touched = session.info.setdefault("written_models", {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        touched.setdefault(type(obj), set()).add(getattr(obj, "id", None))
+
+
+@event.listens_for(db.session, "after_commit")
+def _run_write_listeners(session):
+    touched = session.info.pop("written_models", {})
+    if not touched:
+        return
+    for models, callback, with_ids in _write_listeners:
+        written = {t: ids for t, ids in touched.items() if issubclass(t, models)}
+        if written:
+            try:
+                callback(written) if with_ids else callback()
+            except Exception as e:
+                print(f"Write hook {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_written_models(session):
+    session.info.pop("written_models", None)
+
+
+# LLM answers are built from these tables; drop cached responses when they change
+from ai_local.llm_cache_local import invalidate_llm_cache
+on_model_write((Employee, Goal, Feedback), invalidate_llm_cache)
+
+
+# ==========================
+# STATS
+# ==========================
+from reports_local.stats_local import snapshot as _stats_snapshot
+
+
+def stats_snapshot(manager_id=None):
+    """Company-wide (or one manager's team) StatsSnapshot, aggregated in SQL."""
+    return _stats_snapshot(db.session, Employee, Goal, Feedback, manager_id=manager_id)
+
+
+# ==========================
+# TEAM SNAPSHOTS
+# ==========================
+# Team members, averages and goal completion per manager, shared by
+# team_dashboard and insights. Cached until a write to the team's employees or
+# goals; feedback is not part of the snapshot, so Feedback writes don't
+# invalidate it (set TEAM_SNAPSHOT_DB to share the cache between workers).
+from reports_local.team_snapshot_local import compute as _compute_team_snapshot, make_store as _make_snapshot_store
+
+team_snapshots = _make_snapshot_store()
+
+
+def team_snapshot(manager_id):
+    """Cached TeamSnapshot for one manager's team."""
+    snap, generation = team_snapshots.get(manager_id)
+    if snap is None:
+        snap = _compute_team_snapshot(db.session, Employee, Goal, manager_id)
+        team_snapshots.put(manager_id, snap, generation)
+    return snap
+
+
+def _invalidate_team_snapshots(written):
+    if Employee in written:
+        # an employee can change teams, so both the old and new snapshot are stale
+        team_snapshots.invalidate()
+        return
+    goal_ids = {i for i in written.get(Goal, ()) if i is not None}
+    if not goal_ids:
+        return
+    with db.engine.connect() as conn:
+        rows = conn.execute(
+            select(Goal.id, Employee.manager_id).join(Employee, Goal.employee_id == Employee.id)
+            .where(Goal.id.in_(goal_ids))
+        ).all()
+    if len(rows) < len(goal_ids):
+        # deleted goals can't be traced to a team any more
+        team_snapshots.invalidate()
+    else:
+        team_snapshots.invalidate({manager_id for _, manager_id in rows if manager_id is not None})
+
+
+on_model_write((Employee, Goal), _invalidate_team_snapshots, with_ids=True)
+
+
+# ==========================
+# PERFORMANCE HISTORY
+# ==========================
+# Weekly points per employee behind the chart endpoints. Employee and goal
+# writes mark the employees involved; their current-week points are recorded
+# together every PERFORMANCE_RECORD_SEC (0: on every commit), and
+# 'flask record-performance-week' records everyone. Earlier weeks come from
+# 'flask load-performance' (bulk CSV) or the sample data. Every load also
+# updates the per-manager / per-department rollups.
+from reports_local import timeseries_local as perf_series
+from reports_local import rollups_local
+import atexit
+
+PERFORMANCE_RECORD_SEC = float(os.environ.get("PERFORMANCE_RECORD_SEC", "30"))
+
+_performance_pending = set()  # employee ids written since the last flush
+_performance_lock = threading.Lock()
+_performance_timer = None
+
+
+def load_performance_points(conn, points):
+    """Upsert weekly points and apply them to the rollups, in conn's transaction."""
+    return perf_series.load(conn, PerformanceWeek.__table__, points, rollups=PerformanceRollup.__table__)
+
+
+def _record_performance_week(conn, employee_ids, day=None):
+    points = perf_series.current_points(conn, Employee, Goal, employee_ids, day)
+    return load_performance_points(conn, points)
+
+
+def record_performance_week(employee_ids=None, day=None):
+    """Store this week's (or day's week's) point for the given employees, or for everyone."""
+    with db.engine.begin() as conn:
+        return _record_performance_week(conn, employee_ids if employee_ids is not None else select(Employee.id), day)
+
+
+def _record_written_performance(written):
+    global _performance_timer
+    employee_ids = {i for i in written.get(Employee, ()) if i is not None}
+    goal_ids = {i for i in written.get(Goal, ()) if i is not None}
+    if goal_ids:
+        with db.engine.connect() as conn:
+            employee_ids.update(conn.scalars(select(Goal.employee_id).where(Goal.id.in_(goal_ids))))
+    if not employee_ids:
+        return
+    if PERFORMANCE_RECORD_SEC <= 0:
+        record_performance_week(employee_ids)
+        return
+    with _performance_lock:
+        _performance_pending.update(employee_ids)
+        if _performance_timer is None:
+            _performance_timer = threading.Timer(PERFORMANCE_RECORD_SEC, _flush_performance_timer)
+            _performance_timer.daemon = True
+            _performance_timer.start()
+
+
+def flush_performance_writes():
+    """Record the current-week points of the employees written since the last flush, in one load."""
+    global _performance_timer
+    with _performance_lock:
+        employee_ids = set(_performance_pending)
+        _performance_pending.clear()
+        _performance_timer = None
+    if not employee_ids:
+        return 0
+    try:
+        return record_performance_week(employee_ids)
+    except Exception:
+        with _performance_lock:
+            _performance_pending.update(employee_ids)
+        raise
+
+
+def _flush_performance_timer():
+    with app.app_context():
+        try:
+            flush_performance_writes()
+        except Exception:
+            app.logger.exception("Recording weekly performance points failed")
+
+
+on_model_write((Employee, Goal), _record_written_performance, with_ids=True)
+atexit.register(_flush_performance_timer)
+
+
+def _chart_weeks(default=4):
+    weeks = request.args.get("weeks", default=default, type=int)
+    return perf_series.weeks_ending(datetime.utcnow(), max(2, min(weeks, perf_series.PERFORMANCE_MAX_WEEKS)))
+
+
+def _week_labels(weeks):
+    return [f"{week:%d %b}" for week in weeks[:-1]] + [f"{weeks[-1]:%d %b} (Current)"]
+
+
+def _conditional_json(key, last_modified, build):
+    """
+    JSON response with an ETag derived from key (which must change whenever the
+    body would) and Last-Modified. Answers 304 without calling build() when the
+    client's copy is still current.
+    """
+    etag = hashlib.sha1(repr(key).encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    if request.if_none_match:
+        current = request.if_none_match.contains(etag)
+    else:
+        current = (last_modified is not None and request.if_modified_since is not None
+                   and last_modified <= request.if_modified_since)
+    response = Response(status=304) if current else jsonify(build())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # always revalidate; unchanged charts come back as 304
+    return response
+
+
+def _latest(*timestamps):
+    return max((t for t in timestamps if t is not None), default=None)
+
+
+@app.cli.command("load-performance")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def load_performance_command(path):
+    """
+    Bulk-load weekly points from a CSV with the header
+    employee_id,week_start,performance_score,commits,goals_planned,goals_completed
+    plus optional manager_id,department (default: the employee's current team)
+    """
+    import csv
+
+    def points(reader, teams):
+        for row in reader:
+            employee_id = int(row["employee_id"])
+            manager_id, department = teams.get(employee_id, (None, None))
+            yield perf_series.Point(
+                employee_id, row["week_start"], int(row["performance_score"]),
+                int(row.get("commits") or 0), int(row.get("goals_planned") or 0), int(row.get("goals_completed") or 0),
+                int(row["manager_id"]) if row.get("manager_id") else manager_id, row.get("department") or department
+            )
+
+    start = time.perf_counter()
+    with open(path, newline="") as f, db.engine.begin() as conn:
+        teams = {i: (m, d) for i, m, d in conn.execute(select(Employee.id, Employee.manager_id, Employee.department))}
+        loaded = load_performance_points(conn, points(csv.DictReader(f), teams))
+    elapsed = time.perf_counter() - start
+    click.echo(f"Loaded {loaded} weekly points in {elapsed:.2f}s ({loaded / max(elapsed, 1e-9):.0f} rows/sec)")
+
+
+@app.cli.command("record-performance-week")
+def record_performance_week_command():
+    """Store this week's point for every employee (e.g. from a weekly cron job)."""
+    click.echo(f"Recorded {record_performance_week()} weekly points")
+
+
+def backfill_rollups(conn=None):
+    """Recompute every rollup row from performance_weeks. Returns the row count."""
+    if conn is None:
+        with db.engine.begin() as conn:
+            return backfill_rollups(conn)
+    return rollups_local.backfill(conn, PerformanceRollup.__table__, PerformanceWeek.__table__)
+
+
+def check_rollups():
+    """Discrepancies between the stored rollups and a recomputation (empty when consistent)."""
+    with db.engine.connect() as conn:
+        return rollups_local.check(conn, PerformanceRollup.__table__, PerformanceWeek.__table__)
+
+
+def rollup_series(scope, key, period, periods):
+    """[Rollup or None] for the last `periods` weeks / months of one manager (key = id) or department."""
+    today = datetime.utcnow().date()
+    if period == "week":
+        starts = perf_series.weeks_ending(today, periods)
+    else:
+        starts = rollups_local.months_ending(today, periods)
+    return rollups_local.series(db.session.connection(), PerformanceRollup.__table__, scope, key, period, starts)
+
+
+@app.cli.command("backfill-rollups")
+def backfill_rollups_command():
+    """Rebuild the weekly / monthly team and department rollups from the weekly points."""
+    start = time.perf_counter()
+    rows = backfill_rollups()
+    click.echo(f"Rebuilt {rows} rollup rows in {time.perf_counter() - start:.2f}s")
+
+
+@app.cli.command("check-rollups")
+@click.option("--repair", is_flag=True, help="Backfill when the rollups are inconsistent.")
+def check_rollups_command(repair):
+    """Compare the rollups with a recomputation from the weekly points."""
+    problems = check_rollups()
+    for problem in problems:
+        click.echo(problem)
+    if not problems:
+        click.echo("Rollups are consistent")
+    elif repair:
+        click.echo(f"Rebuilt {backfill_rollups()} rollup rows")
+    else:
+        raise SystemExit(1)
+
+
 @app.template_filter()
 def format_number(value):
     try:
@@ -311,22 +787,18 @@ def get_user_dashboard(user_id):
     employee = Employee.query.filter_by(user_id=user.id).first()
     if not employee:
         return None
-    goals = Goal.query.filter_by(employee_id=employee.id).all()
 
-    total_goals = len(goals)
-    completed_goals = len([goal for goal in goals if goal.status == "Completed"])
+    # Goals, feedback, recognition / bonus and leadership counts in one statement
+    total_goals, completed_goals, feedback_count, bonus_count, total_bonus, leadership_activities = db.session.execute(select(
+        select(func.count(Goal.id)).where(Goal.employee_id == employee.id).scalar_subquery(),
+        select(func.count(Goal.id)).where(Goal.employee_id == employee.id, Goal.status == "Completed").scalar_subquery(),
+        select(func.count(Feedback.id)).where(Feedback.user_id == user.id).scalar_subquery(),
+        select(func.count(Bonus.id)).where(Bonus.employee_id == employee.id).scalar_subquery(),
+        select(func.coalesce(func.sum(Bonus.amount), 0)).where(Bonus.employee_id == employee.id).scalar_subquery(),
+        select(func.count(LeadershipActivity.id)).where(LeadershipActivity.manager_id == user.id).scalar_subquery(),
+    )).one()
     completion = (completed_goals / total_goals) * 100 if total_goals else 0
 
-    # Feedback
-    feedback_count = Feedback.query.filter_by(user_id=user.id).count()
-
-    # Recognition / Bonus
-    bonus_count = Bonus.query.filter_by(employee_id=employee.id).count()
-    total_bonus = sum(b.amount for b in Bonus.query.filter_by(employee_id=employee.id).all())
-
-    # Leadership / Team Activity
-    leadership_activities = LeadershipActivity.query.filter_by(manager_id=user.id).count()
-
     dashboard_data = {
         "user": user,
         "completion": round(completion, 2),
@@ -348,8 +820,7 @@ def init_db():
     Initialize database and create tables if they don't exist.
     Only adds sample data if database is empty.
     """
-    db_path = os.path.join(BASE_DIR, "workwise.db")
-    is_new_db = not os.path.exists(db_path)
+    is_new_db = not os.path.exists(DB_PATH)
 
     # Create tables if they don't exist (doesn't delete existing DB)
     db.create_all()
@@ -417,18 +888,75 @@ def init_db():
                 commits=random.randint(50, 100),
                 reward=random.choice(["Bonus", "Recognition", "Gift Voucher"])
             )
-            emp.recent_activities = [
-                {"action": f"Completed task {j}", "time_ago": f"{random.randint(1, 24)} hours ago"}
-                for j in range(1, 4)
-            ]
+            for j in range(1, 4):
+                emp.activities.append(EmployeeActivity(
+                    action=f"Completed task {j}",
+                    timestamp=datetime.utcnow() - timedelta(hours=random.randint(1, 24))
+                ))
             db.session.add(emp)
 
         db.session.commit()
         print("✅ 50 employees created.")
+
+        # Sample history: 11 weeks before the current one (recorded by the write hook)
+        history = []
+        for emp in Employee.query.all():
+            score, commits = emp.performance_score, emp.commits
+            for week in reversed(perf_series.weeks_ending(datetime.utcnow(), 12)[:-1]):
+                score = max(min(score - random.randint(-4, 6), 100), 40)
+                commits = max(commits - random.randint(3, 12), 0)
+                planned = random.randint(2, 6)
+                history.append(perf_series.Point(emp.id, week, score, commits, planned,
+                                                 planned - random.randint(0, 2), emp.manager_id, emp.department))
+        with db.engine.begin() as conn:
+            load_performance_points(conn, history)
+        print("✅ Performance history created.")
     else:
         print("ℹ️  Database already has users. Skipping sample data.")
 
 
+# ==========================
+# SCHEMA MIGRATIONS
+# ==========================
+# Run-once migrations that bring an existing workwise.db up to the current
+# schema (runner in reports_local/migrations_local.py). Append new ones;
+# never edit one that has shipped.
+from reports_local import migrations_local
+
+
+def _add_performance_rollups(conn):
+    """Team columns on performance_weeks (filled from each employee's current team), then the rollups."""
+    migrations_local.add_performance_team_columns(conn)
+    backfill_rollups(conn)
+
+
+MIGRATIONS = [
+    ("0001_hot_path_indexes", lambda conn: migrations_local.create_missing_indexes(conn, db.metadata)),
+    ("0002_activity_log", lambda conn: migrations_local.move_pickled_activities(conn, EmployeeActivity.__table__)),
+    # charts have no history before this; start it with the current week
+    ("0003_performance_history", lambda conn: _record_performance_week(conn, select(Employee.id))),
+    ("0004_performance_rollups", _add_performance_rollups),
+    # the leaderboard moved in memory; nothing orders employees by score or commits in SQL
+    ("0005_drop_ranking_indexes", lambda conn: migrations_local.drop_indexes(conn, (
+        "ix_employees_performance", "ix_employees_commits",
+        "ix_employees_position_performance", "ix_employees_position_commits",
+    ))),
+]
+
+
+def migrate_db():
+    """Create missing tables, then apply pending migrations. Returns the versions applied."""
+    db.create_all()
+    return migrations_local.migrate(db.engine, MIGRATIONS)
+
+
+@app.cli.command("migrate-db")
+def migrate_db_command():
+    """Bring an existing workwise.db up to the current schema."""
+    applied = migrate_db()
+    click.echo(f"Applied {len(applied)} migration(s)" + (": " + ", ".join(applied) if applied else ""))
+
+
 # ==========================
 # LOGIN HELPERS
 # ==========================
@@ -441,6 +969,36 @@ def get_user_by_id(user_id):
     return User.query.get(user_id)
 
 
+# ==========================
+# ACTIVITY LOG
+# ==========================
+
+def log_activity(employee_id, action, timestamp=None):
+    """Append one activity; a single INSERT however long the history is. Caller commits."""
+    activity = EmployeeActivity(employee_id=employee_id, action=action, timestamp=timestamp or datetime.utcnow())
+    db.session.add(activity)
+    return activity
+
+
+def recent_employee_activities(employee_id, limit=5):
+    """Latest activities first, read from the (employee_id, timestamp) index."""
+    return (
+        EmployeeActivity.query.filter_by(employee_id=employee_id)
+        .order_by(EmployeeActivity.timestamp.desc(), EmployeeActivity.id.desc())
+        .limit(limit).all()
+    )
+
+
+def time_ago(timestamp):
+    time_diff = datetime.utcnow() - timestamp
+    if time_diff.days > 0:
+        return f"{time_diff.days} day{'s' if time_diff.days > 1 else ''} ago"
+    elif time_diff.seconds > 3600:
+        return f"{time_diff.seconds // 3600} hour{'s' if time_diff.seconds // 3600 > 1 else ''} ago"
+    else:
+        return f"{time_diff.seconds // 60} minute{'s' if time_diff.seconds // 60 > 1 else ''} ago"
+
+
 def login_required(view):
     @wraps(view)
     def wrapped_view(*args, **kwargs):
@@ -550,12 +1108,109 @@ def feedback_received():
 @login_required
 def feedback_given():
     user = User.query.get(session["user_id"])
-    feedbacks = Feedback.query.filter_by(giver_id=user.id).order_by(Feedback.created_at.desc()).all()
+    feedbacks = (
+        Feedback.query.options(joinedload(Feedback.giver))
+        .filter_by(giver_id=user.id).order_by(Feedback.created_at.desc()).all()
+    )
     feedback_list = [f.to_dict() for f in feedbacks]
 
     return render_template("feedback_given.html", user=user, feedback_list=feedback_list)
 
 
+# ==========================
+# RANKING
+# ==========================
+from reports_local.leaderboard_local import LeaderboardIndex, Entry as LeaderboardEntry, SORTS as LEADERBOARD_SORTS
+
+# The leaderboard is served from an in-memory index (reports_local/leaderboard_local.py)
+# kept current by the Employee write hook below. Every LEADERBOARD_PROBE_SEC a
+# one-row probe reads the table version (row count, latest updated_at and the
+# sums of the ranked columns) and rebuilds the index when it differs from the
+# version the index was built at, which covers writes made by other processes.
+# Renames and position changes show up through updated_at, which the ORM bumps
+# on every update; `flask rebuild-leaderboard` forces a rebuild.
+LEADERBOARD_PAGE_SIZE = int(os.environ.get("LEADERBOARD_PAGE_SIZE", "50"))
+LEADERBOARD_PROBE_SEC = float(os.environ.get("LEADERBOARD_PROBE_SEC", "60"))
+
+leaderboard_index = LeaderboardIndex()
+_leaderboard_lock = threading.Lock()
+_leaderboard_probed_at = 0.0
+
+
+def _leaderboard_entries(conn, ids=None):
+    q = select(Employee.id, Employee.name, Employee.position, Employee.performance_score, Employee.commits)
+    if ids is not None:
+        q = q.where(Employee.id.in_(ids))
+    return [LeaderboardEntry(*row) for row in conn.execute(q)]
+
+
+def _leaderboard_version(conn):
+    return tuple(conn.execute(select(
+        func.count(Employee.id),
+        func.max(Employee.updated_at),
+        func.coalesce(func.sum(func.coalesce(Employee.performance_score, 0)), 0),
+        func.coalesce(func.sum(func.coalesce(Employee.commits, 0)), 0),
+    )).one())
+
+
+def rebuild_leaderboard():
+    global _leaderboard_probed_at
+    with db.engine.connect() as conn:
+        # version first: a write landing between the two reads costs one extra rebuild, never a missed one
+        version = _leaderboard_version(conn)
+        leaderboard_index.rebuild(_leaderboard_entries(conn), version)
+    _leaderboard_probed_at = time.monotonic()
+
+
+def get_leaderboard():
+    """The leaderboard index, loaded on first use and re-verified every LEADERBOARD_PROBE_SEC."""
+    global _leaderboard_probed_at
+    due = LEADERBOARD_PROBE_SEC > 0 and time.monotonic() - _leaderboard_probed_at > LEADERBOARD_PROBE_SEC
+    if not leaderboard_index.loaded or due:
+        with _leaderboard_lock:
+            if not leaderboard_index.loaded:
+                rebuild_leaderboard()
+            elif LEADERBOARD_PROBE_SEC > 0 and time.monotonic() - _leaderboard_probed_at > LEADERBOARD_PROBE_SEC:
+                with db.engine.connect() as conn:
+                    consistent = _leaderboard_version(conn) == leaderboard_index.version
+                if consistent:
+                    _leaderboard_probed_at = time.monotonic()
+                else:
+                    rebuild_leaderboard()
+    return leaderboard_index
+
+
+def _refresh_leaderboard(written):
+    if not leaderboard_index.loaded:
+        return
+    ids = {i for i in written.get(Employee, ()) if i is not None}
+    if ids:
+        with db.engine.connect() as conn:
+            leaderboard_index.apply(ids, _leaderboard_entries(conn, ids))
+
+
+on_model_write((Employee,), _refresh_leaderboard, with_ids=True)
+
+
+def check_leaderboard():
+    """Full comparison of the index with the employees table; returns the discrepancies."""
+    with db.engine.connect() as conn:
+        return get_leaderboard().check(_leaderboard_entries(conn))
+
+
+@app.cli.command("rebuild-leaderboard")
+def rebuild_leaderboard_command():
+    """Reload the in-memory leaderboard from the employees table and verify it."""
+    start = time.perf_counter()
+    rebuild_leaderboard()
+    click.echo(f"Rebuilt the leaderboard with {len(leaderboard_index)} employees in {time.perf_counter() - start:.2f}s")
+    problems = check_leaderboard()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise SystemExit(1)
+
+
 # ==========================
 # DASHBOARDS
 # ==========================
@@ -567,7 +1222,6 @@ def your_dashboard():
 
     if user.role == "Manager":
         # Manager's personal dashboard
-        team_members = Employee.query.filter_by(manager_id=user.id).all()
 
         # Calculate manager metrics
         goal_progress = (user.goals_assigned / user.goals_total * 100) if user.goals_total > 0 else 0
@@ -615,17 +1269,9 @@ def your_dashboard():
 
         recent_activities = []
         for activity in activities_query:
-            time_diff = datetime.utcnow() - activity.timestamp
-            if time_diff.days > 0:
-                time_ago = f"{time_diff.days} day{'s' if time_diff.days > 1 else ''} ago"
-            elif time_diff.seconds > 3600:
-                time_ago = f"{time_diff.seconds // 3600} hour{'s' if time_diff.seconds // 3600 > 1 else ''} ago"
-            else:
-                time_ago = f"{time_diff.seconds // 60} minute{'s' if time_diff.seconds // 60 > 1 else ''} ago"
-
             recent_activities.append({
                 "title": activity.action,
-                "time_ago": time_ago,
+                "time_ago": time_ago(activity.timestamp),
                 "dot_class": "dot-green"
             })
 
@@ -660,9 +1306,7 @@ def your_dashboard():
         bonus_amount = bonus_this_month.amount if bonus_this_month else 0
 
         # Get employee rank
-        all_employees = Employee.query.all()
-        sorted_employees = sorted(all_employees, key=lambda e: e.performance_score, reverse=True)
-        employee_rank = next((i + 1 for i, e in enumerate(sorted_employees) if e.id == employee.id), 0)
+        employee_rank = get_leaderboard().rank(employee.id)
 
         summary_cards = [
             {
@@ -706,13 +1350,12 @@ def your_dashboard():
 
         # Recent activities for employee
         recent_activities = []
-        if employee.recent_activities:
-            for activity in employee.recent_activities[:5]:
-                recent_activities.append({
-                    "title": activity.get("action", "Activity"),
-                    "time_ago": activity.get("time_ago", "Recently"),
-                    "dot_class": "dot-blue"
-                })
+        for activity in recent_employee_activities(employee.id, 5):
+            recent_activities.append({
+                "title": activity.action,
+                "time_ago": time_ago(activity.timestamp),
+                "dot_class": "dot-blue"
+            })
 
         return render_template(
             "your_dashboard.html",
@@ -733,18 +1376,22 @@ def team_dashboard():
         flash("Access denied. Only managers can access Team Dashboard.", "danger")
         return redirect(url_for("your_dashboard"))
 
-    team_members = Employee.query.filter_by(manager_id=user.id).all()
-
-    avg_performance = sum([e.performance_score for e in team_members]) / len(team_members) if team_members else 0
-    total_commits = sum([e.commits or 0 for e in team_members])
+    team = team_snapshot(user.id)
+    team_members = team.members
 
-    team_employee_ids = [e.id for e in team_members]
-    all_goals = Goal.query.filter(Goal.employee_id.in_(team_employee_ids)).all() if team_employee_ids else []
+    avg_performance = team.avg_performance
+    total_commits = team.total_commits
 
-    goals_completed = len([g for g in all_goals if g.status == "Completed"])
-    goals_target = len(all_goals) if all_goals else 10
+    goals_completed = team.goals_completed
+    goals_target = team.goals_total or 10
     goal_progress = (goals_completed / goals_target * 100) if goals_target > 0 else 0
 
+    # week-over-week change of the team average, from the weekly rollups
+    last_week, this_week = rollup_series("manager", user.id, "week", 2)
+    score_subtitle = "Team average score"
+    if last_week and this_week:
+        score_subtitle += f" ({this_week.avg_score - last_week.avg_score:+.1f} vs last week)"
+
     summary_cards = [
         {
             "title": "Team Size",
@@ -757,7 +1404,7 @@ def team_dashboard():
         {
             "title": "Avg Performance",
             "main_value": f"{avg_performance:.1f}%",
-            "subtitle": "Team average score",
+            "subtitle": score_subtitle,
             "icon": "trending_up",
             "css_class": "summary-card",
             "value_class": "highlight-green" if avg_performance >= 75 else "highlight-orange"
@@ -803,7 +1450,7 @@ def team_dashboard():
             "score_color": score_color
         })
 
-    employee_list.sort(key=lambda e: e["score"], reverse=True)
+    # team.members is already ordered by score, highest first
 
     return render_template(
         "team_dashboard.html",
@@ -823,7 +1470,12 @@ def employee_detail(employee_id):
         return redirect(url_for("your_dashboard"))
 
     employee = Employee.query.get(employee_id)
-    return render_template("employee-detail-view.html", employee=employee, active_page="employees")
+    activities = [
+        {"action": a.action, "time_ago": time_ago(a.timestamp)}
+        for a in recent_employee_activities(employee.id, 10)
+    ]
+    return render_template("employee-detail-view.html", employee=employee, activities=activities,
+                           active_page="employees")
 
 
 @app.route("/insights")
@@ -834,20 +1486,18 @@ def insights():
     ai_suggestions = []
 
     if user.role == "Manager":
-        team_members = Employee.query.filter_by(manager_id=user.id).all()
+        team = team_snapshot(user.id)
 
-        top_performers = sorted(team_members, key=lambda e: e.performance_score, reverse=True)[:5]
-        attention_needed = sorted(team_members, key=lambda e: e.performance_score)[:5]
-        avg_performance = sum([e.performance_score for e in team_members]) / len(team_members) if team_members else 0
+        top_performers = team.top_performers
+        attention_needed = team.attention_needed
+        avg_performance = team.avg_performance
 
-        team_employee_ids = [e.id for e in team_members]
-        all_goals = Goal.query.filter(Goal.employee_id.in_(team_employee_ids)).all() if team_employee_ids else []
-        goals_completed = len([g for g in all_goals if g.status == "Completed"])
-        goals_target = len(all_goals) if all_goals else 10
+        goals_completed = team.goals_completed
+        goals_target = team.goals_total or 10
         goal_completion_rate = int((goals_completed / goals_target * 100)) if goals_target > 0 else 0
 
         # 🤖 AI PLACEHOLDER - Replace with actual AI-generated suggestions
-        low_count = len([e for e in team_members if e.performance_score < 70])
+        low_count = team.count_below(70)
         if low_count > 0:
             ai_suggestions.append({
                 "type": "alert",
@@ -855,7 +1505,7 @@ def insights():
                 "text": f"{low_count} team member{'s' if low_count > 1 else ''} below 70% performance. Schedule 1-on-1 meetings to provide support."
             })
 
-        high_count = len([e for e in team_members if e.performance_score >= 90])
+        high_count = team.count_at_least(90)
         if high_count > 0:
             ai_suggestions.append({
                 "type": "success",
@@ -876,6 +1526,37 @@ def insights():
                 "text": f"Team is at {goal_completion_rate}% goal completion. Consider stretch goals for high performers."
             })
 
+        # Trends from the monthly team rollups and the department's weekly rollups
+        last_month, this_month = rollup_series("manager", user.id, "month", 2)
+        if last_month and this_month:
+            change = this_month.avg_score - last_month.avg_score
+            if change <= -3:
+                ai_suggestions.append({
+                    "type": "alert",
+                    "title": "Team Trending Down",
+                    "text": f"Average score is down {-change:.1f} points on last month. Check workload and blockers."
+                })
+            elif change >= 3:
+                ai_suggestions.append({
+                    "type": "success",
+                    "title": "Team Trending Up",
+                    "text": f"Average score is up {change:.1f} points on last month. Share what is working with the team."
+                })
+
+        departments = db.session.scalars(
+            select(Employee.department).where(Employee.manager_id == user.id).distinct()
+        ).all()
+        if len(departments) == 1 and departments[0]:
+            department = departments[0]
+            team_week = rollup_series("manager", user.id, "week", 1)[0]
+            department_week = rollup_series("department", department, "week", 1)[0]
+            if team_week and department_week and team_week.avg_score < department_week.avg_score - 5:
+                ai_suggestions.append({
+                    "type": "alert",
+                    "title": "Below Department Average",
+                    "text": f"Team averages {team_week.avg_score:.1f} this week against {department_week.avg_score:.1f} across {department}."
+                })
+
         return render_template(
             "insights.html",
             user=user,
@@ -930,38 +1611,31 @@ def leaderboard():
 
     role_filter = request.args.get('role', 'All Roles')
     sort_option = request.args.get('sort', 'performance_desc')
-
-    query = Employee.query
-
-    if role_filter != 'All Roles':
-        query = query.filter_by(position=role_filter)
-
-    employees = query.all()
-
-    if sort_option == 'performance_desc':
-        employees.sort(key=lambda e: e.performance_score, reverse=True)
-    elif sort_option == 'performance_asc':
-        employees.sort(key=lambda e: e.performance_score)
-    elif sort_option == 'commits_desc':
-        employees.sort(key=lambda e: e.commits or 0, reverse=True)
-    elif sort_option == 'commits_asc':
-        employees.sort(key=lambda e: e.commits or 0)
+    if sort_option not in LEADERBOARD_SORTS:
+        sort_option = 'performance_desc'
+
+    board = get_leaderboard()
+    rows, next_cursor = board.page(
+        None if role_filter == 'All Roles' else role_filter,
+        sort_option,
+        after=request.args.get('after'),
+        limit=LEADERBOARD_PAGE_SIZE
+    )
 
     leaderboard_data = []
-    for idx, emp in enumerate(employees, start=1):
+    for row in rows:
         leaderboard_data.append({
-            "rank": idx,
-            "name": emp.name,
-            "role": emp.position,
-            "score": emp.performance_score,
-            "commits": emp.commits,
-            "initials": "".join([n[0] for n in emp.name.split()][:2]).upper(),
+            "rank": row.rank,
+            "name": row.name,
+            "role": row.position,
+            "score": row.performance_score,
+            "commits": row.commits,
+            "initials": "".join([n[0] for n in row.name.split()][:2]).upper(),
             "initials_class": "initials-blue",
-            "score_class": "top-score" if idx == 1 else "",
+            "score_class": "top-score" if row.rank == 1 else "",
         })
 
-    all_employees = Employee.query.all()
-    roles_filter = ["All Roles"] + sorted(set(e.position for e in all_employees if e.position))
+    roles_filter = ["All Roles"] + board.positions()
     sort_options = [
         {"key": "performance_desc", "label": "Performance ↓"},
         {"key": "performance_asc", "label": "Performance ↑"},
@@ -977,47 +1651,92 @@ def leaderboard():
         leaderboard_data=leaderboard_data,
         current_role_filter=role_filter,
         current_sort_filter=dict((o['key'], o['label']) for o in sort_options).get(sort_option, "Performance ↓"),
+        current_sort=sort_option,
         roles_filter=roles_filter,
         sort_options=sort_options,
+        next_cursor=next_cursor,
         ai_tip=ai_tip
     )
 
 
+@app.route("/leaderboard/consistency", methods=["GET"])
+@login_required
+def leaderboard_consistency():
+    """Compare the in-memory leaderboard with the employees table; ?repair=1 rebuilds it on mismatch."""
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    problems = check_leaderboard()
+    repaired = False
+    if problems and request.args.get("repair") == "1":
+        rebuild_leaderboard()
+        repaired = True
+    return jsonify({"success": True, "consistent": not problems, "problems": problems, "repaired": repaired})
+
+
+@app.route("/leaderboard/rebuild", methods=["POST"])
+@login_required
+def leaderboard_rebuild():
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    rebuild_leaderboard()
+    return jsonify({"success": True, "employees": len(leaderboard_index)})
+
+
 @app.route('/performance_data')
 @login_required
 def performance_data():
+    """Manager: each team member's score this week vs last week. Employee: own weekly scores."""
     try:
         user = User.query.get(session['user_id'])
+        table = PerformanceWeek.__table__
+        conn = db.session.connection()
 
         if user.role == 'Manager':
-            team_members = Employee.query.filter_by(manager_id=user.id).all()
+            weeks = perf_series.weeks_ending(datetime.utcnow(), 2)
+            team = select(Employee.id).where(Employee.manager_id == user.id)
+            team_count, team_updated = conn.execute(
+                select(func.count(), func.max(Employee.updated_at)).where(Employee.manager_id == user.id)
+            ).one()
+            points, points_updated = perf_series.validator(conn, table, team, weeks)
+
+            def build():
+                team_members = Employee.query.filter_by(manager_id=user.id).order_by(Employee.id).all()
+                series = perf_series.window(conn, table, team, weeks)
+                previous, current = [], []
+                for e in team_members:
+                    prev_point, cur_point = series.get(e.id, [None, None])
+                    previous.append(prev_point.performance_score if prev_point else None)
+                    current.append(cur_point.performance_score if cur_point else e.performance_score)
+                return {
+                    "labels": [e.name for e in team_members],
+                    "current_week": current,
+                    "previous_week": previous
+                }
+
+            key = ("team", user.id, weeks[-1], team_count, team_updated, points, points_updated)
+            return _conditional_json(key, _latest(team_updated, points_updated), build)
 
-            data = {
-                "labels": [e.name for e in team_members],
-                "current_week": [e.performance_score for e in team_members],
-                "previous_week": [max(e.performance_score - 5, 0) for e in team_members]
-            }
-        else:
-            employee = Employee.query.filter_by(user_id=user.id).first()
-
-            if not employee:
-                return jsonify({"error": "Employee profile not found"}), 404
+        employee = Employee.query.filter_by(user_id=user.id).first()
 
-            import random
-            current_score = employee.performance_score
-
-            data = {
-                "labels": ["Week 1", "Week 2", "Week 3", "Week 4 (Current)"],
-                "current_week": [
-                    max(current_score - random.randint(10, 20), 50),
-                    max(current_score - random.randint(5, 15), 55),
-                    max(current_score - random.randint(0, 10), 60),
-                    current_score
-                ],
+        if not employee:
+            return jsonify({"error": "Employee profile not found"}), 404
+
+        weeks = _chart_weeks()
+        points, points_updated = perf_series.validator(conn, table, [employee.id], weeks)
+
+        def build():
+            series = perf_series.window(conn, table, [employee.id], weeks).get(employee.id, [None] * len(weeks))
+            scores = [p.performance_score if p else None for p in series]
+            if scores[-1] is None:
+                scores[-1] = employee.performance_score
+            return {
+                "labels": _week_labels(weeks),
+                "current_week": scores,
                 "previous_week": []
             }
 
-        return jsonify(data)
+        key = ("employee", employee.id, weeks, employee.updated_at, points, points_updated)
+        return _conditional_json(key, _latest(employee.updated_at, points_updated), build)
 
     except Exception as e:
         print(f"Error in performance_data: {str(e)}")
@@ -1027,36 +1746,42 @@ def performance_data():
 @app.route('/personal_performance_data')
 @login_required
 def personal_performance_data():
+    """Goals planned (due) vs completed per week, for the manager's team or the employee."""
     try:
         user = User.query.get(session['user_id'])
+        conn = db.session.connection()
+        weeks = _chart_weeks()
 
         if user.role == 'Manager':
-            data = {
-                "labels": ["Week 1", "Week 2", "Week 3", "Week 4"],
-                "planned": [10, 15, 20, 25],
-                "actual": [8, 14, 18, 23]
-            }
+            # the team's weekly rollups: one row per week whatever the team size
+            table = PerformanceRollup.__table__
+            points, points_updated = rollups_local.validator(conn, table, "manager", user.id, "week", weeks)
+
+            def totals():
+                return [(r.goals_planned, r.goals_completed) if r else (0, 0)
+                        for r in rollups_local.series(conn, table, "manager", user.id, "week", weeks)]
         else:
             employee = Employee.query.filter_by(user_id=user.id).first()
 
             if not employee:
                 return jsonify({"error": "Employee profile not found"}), 404
 
-            import random
-            planned_base = [10, 15, 20, 25]
-            actual_goals = []
+            table = PerformanceWeek.__table__
+            points, points_updated = perf_series.validator(conn, table, [employee.id], weeks)
 
-            for planned in planned_base:
-                actual = planned - random.randint(0, 3)
-                actual_goals.append(max(actual, 0))
+            def totals():
+                return perf_series.team_totals(conn, table, [employee.id], weeks)
 
-            data = {
-                "labels": ["Week 1", "Week 2", "Week 3", "Week 4"],
-                "planned": planned_base,
-                "actual": actual_goals
+        def build():
+            goals = totals()
+            return {
+                "labels": _week_labels(weeks),
+                "planned": [planned for planned, _ in goals],
+                "actual": [completed for _, completed in goals]
             }
 
-        return jsonify(data)
+        key = ("goals", user.id, weeks, points, points_updated)
+        return _conditional_json(key, points_updated, build)
 
     except Exception as e:
         print(f"Error in personal_performance_data: {str(e)}")
@@ -1068,7 +1793,7 @@ def personal_performance_data():
 def employee_performance_data(employee_id):
     """
     Returns performance data for a specific employee
-    Current month vs Previous month comparison
+    Last 4 weeks vs the 4 weeks before
     """
     try:
         user = User.query.get(session['user_id'])
@@ -1084,33 +1809,25 @@ def employee_performance_data(employee_id):
         if employee.manager_id != user.id:
             return jsonify({"error": "Unauthorized access to this employee"}), 403
 
-        import random
-
-        current_score = employee.performance_score
-
-        current_month_data = [
-            max(current_score - random.randint(15, 25), 50),
-            max(current_score - random.randint(10, 20), 55),
-            max(current_score - random.randint(5, 15), 60),
-            current_score
-        ]
-
-        previous_avg = max(current_score - 10, 50)
-        previous_month_data = [
-            max(previous_avg - random.randint(5, 15), 45),
-            max(previous_avg - random.randint(0, 10), 50),
-            max(previous_avg + random.randint(0, 5), 50),
-            max(previous_avg + random.randint(0, 8), 50)
-        ]
-
-        data = {
-            "labels": ["Week 1", "Week 2", "Week 3", "Week 4"],
-            "current_month": current_month_data,
-            "previous_month": previous_month_data,
-            "employee_name": employee.name
-        }
+        table = PerformanceWeek.__table__
+        conn = db.session.connection()
+        weeks = perf_series.weeks_ending(datetime.utcnow(), 8)
+        points, points_updated = perf_series.validator(conn, table, [employee.id], weeks)
+
+        def build():
+            series = perf_series.window(conn, table, [employee.id], weeks).get(employee.id, [None] * len(weeks))
+            scores = [p.performance_score if p else None for p in series]
+            if scores[-1] is None:
+                scores[-1] = employee.performance_score
+            return {
+                "labels": ["Week 1", "Week 2", "Week 3", "Week 4"],
+                "current_month": scores[4:],
+                "previous_month": scores[:4],
+                "employee_name": employee.name
+            }
 
-        return jsonify(data)
+        key = ("employee_month", employee.id, weeks[-1], employee.updated_at, points, points_updated)
+        return _conditional_json(key, _latest(employee.updated_at, points_updated), build)
 
     except Exception as e:
         print(f"Error in employee_performance_data: {str(e)}")
@@ -1147,6 +1864,10 @@ def submit_work():
 
         response.raise_for_status()
 
+        if employee:
+            log_activity(employee.id, f"Posted work: {title}"[:200])
+            db.session.commit()
+
         return jsonify({"status": "success", "message": "Work posted to LinkedIn successfully!"}), 200
 
     except Exception as e:
@@ -1159,9 +1880,11 @@ def submit_work():
 def goals_management():
     user = User.query.get(session['user_id'])
 
+    # contains_eager: goal.employee comes from the join, not one lazy load per goal
     assigned_goals = (
         db.session.query(Goal)
         .join(Employee)
+        .options(contains_eager(Goal.employee))
         .filter(Employee.manager_id == user.id, Goal.status == "Assigned")
         .all()
     )
@@ -1169,6 +1892,7 @@ def goals_management():
     completed_goals = (
         db.session.query(Goal)
         .join(Employee)
+        .options(contains_eager(Goal.employee))
         .filter(Employee.manager_id == user.id, Goal.status == "Completed")
         .order_by(Goal.id.desc())
         .limit(5)
@@ -1244,130 +1968,164 @@ def complete_goal():
         print(f"Error completing goal: {str(e)}")
         return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
 
-@app.route("/download_ai_report", methods=["GET"])
-def download_ai_report():
-    """Generate and return a PDF version of the latest AI Insights (PDF only, not on page)."""
+# ==========================
+# REPORT ARCHIVE
+# ==========================
+from reports_local.archive_local import ReportArchive, fingerprint as report_fingerprint
+from reports_local.pdf_bounded_local import PdfRenderError, get_renderer
+
+# Archived reports live in their own directory so the retention sweep never
+# touches anything else under reports/
+report_archive = ReportArchive(os.path.join(BASE_DIR, "reports", "archive"))
+
+_REPORT_TEMPLATE = "ai_report_template.html"
+
+
+class ReportGenerationError(Exception):
+    """Report could not be produced for a reason worth showing to the user."""
+
+
+def _ai_report_inputs(manager_id=None):
+    """
+    (StatsSnapshot, LLM prompt) for an AI report; manager_id limits it to that
+    manager's team. Everything the report shows comes from these. Needs an app context.
+    """
+    stats = stats_snapshot(manager_id)
+    scope = stats.scope
+    prompt = f"""
+            You are the WorkWise AI Analyst. Analyze the following data and create a detailed {scope.lower()} insight report.
+            Provide sections for Key Observations, Actionable Recommendations, and Overall Sentiment.
+
+            {scope} Data:
+            Total Employees: {stats.total_employees}
+            Average Performance Score: {stats.avg_performance}
+            Completed Goals: {stats.completed_goals}
+            Pending Goals: {stats.pending_goals}
+            Total Feedback Entries: {stats.feedback_count}
+
+            Top Performers:
+            {chr(10).join([f"{e.name}: {e.score}" for e in stats.top_performers])}
+            """
+    return stats, prompt
+
+
+def _ai_report_fingerprint(prompt):
+    """Archive key for a report: its prompt (which holds all of its data), the LLM model and the template."""
+    from ai_local.llama_local import OLLAMA_MODEL
+
+    template = app.jinja_env.loader.get_source(app.jinja_env, _REPORT_TEMPLATE)[0]
+    return report_fingerprint("\n".join((prompt, OLLAMA_MODEL, template)))
+
+
+def _render_ai_report_html(stats, prompt):
+    """Ask the LLM for insights and render the AI report HTML. Needs an app context."""
     try:
-        from ai_local.llama_local import call_local_llama
+        from ai_local.llama_async_local import call_local_llama
     except Exception:
         call_local_llama = None
 
+    # --- Human-readable fallback summary ---
+    fallback_summary = f"""
+    {stats.scope} Snapshot:
+    - Total Employees: {stats.total_employees}
+    - Average Performance Score: {stats.avg_performance}
+    - Completed Goals: {stats.completed_goals}
+    - Pending Goals: {stats.pending_goals}
+    - Total Feedback Entries: {stats.feedback_count}
+
+    Top Performers:
+    {chr(10).join([f"- {e.name}: {e.score}" for e in stats.top_performers])}
+    """.replace("\n", "<br>")
+
+    # --- AI report text ---
+    insights = ""
     try:
-        import pdfkit
-        import io
-        import shutil
-        import os
-        from datetime import datetime
-        from flask import send_file, render_template, jsonify
-
-        # --- Gather database data ---
-        employees = Employee.query.all()
-        total_employees = len(employees)
-        avg_performance = round(
-            sum([getattr(e, "performance_score", 0) for e in employees]) / total_employees, 2
-        ) if total_employees else 0
-        goals = Goal.query.all() if 'Goal' in globals() else []
-        feedbacks = Feedback.query.all() if 'Feedback' in globals() else []
-        completed_goals = sum(1 for g in goals if getattr(g, "status", "").lower() == "completed")
-        pending_goals = sum(1 for g in goals if getattr(g, "status", "").lower() != "completed")
-        feedback_count = len(feedbacks)
-
-        # --- Top Performers ---
-        top_emps = sorted(employees, key=lambda e: getattr(e, "performance_score", 0), reverse=True)[:5]
-        top_performers = [{"name": e.name, "score": getattr(e, "performance_score", "N/A")} for e in top_emps]
-
-        # --- Human-readable fallback summary ---
-        fallback_summary = f"""
-        Company Snapshot:
-        - Total Employees: {total_employees}
-        - Average Performance Score: {avg_performance}
-        - Completed Goals: {completed_goals}
-        - Pending Goals: {pending_goals}
-        - Total Feedback Entries: {feedback_count}
+        if call_local_llama:
+            ai_response = call_local_llama(prompt)
+            insights = str(ai_response).strip() if ai_response else ""
+    except Exception:
+        insights = ""
 
-        Top Performers:
-        {chr(10).join([f"- {e['name']}: {e['score']}" for e in top_performers])}
-        """.replace("\n", "<br>")
+    # --- Clean AI text ---
+    insights_html = insights.replace("\n", "<br>") if insights else ""
 
-        # --- AI report text ---
-        insights = ""
-        try:
-            if call_local_llama:
-                prompt = f"""
-                You are the WorkWise AI Analyst. Analyze the following data and create a detailed company insight report.
-                Provide sections for Key Observations, Actionable Recommendations, and Overall Sentiment.
-
-                Company Data:
-                Total Employees: {total_employees}
-                Average Performance Score: {avg_performance}
-                Completed Goals: {completed_goals}
-                Pending Goals: {pending_goals}
-                Total Feedback Entries: {feedback_count}
-
-                Top Performers:
-                {chr(10).join([f"{e['name']}: {e['score']}" for e in top_performers])}
-                """
-                ai_response = call_local_llama(prompt)
-                insights = str(ai_response).strip() if ai_response else ""
-        except Exception:
-            insights = ""
-
-        # --- Clean AI text ---
-        insights_html = insights.replace("\n", "<br>") if insights else ""
-
-        # --- Render HTML template ---
-        rendered_html = render_template(
-            "ai_report_template.html",
-            date=datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
-            total_employees=total_employees,
-            avg_performance=avg_performance,
-            completed_goals=completed_goals,
-            pending_goals=pending_goals,
-            feedback_count=feedback_count,
-            top_performers=top_performers,
-            insights=insights_html,
-            fallback_summary=fallback_summary
-        )
+    # --- Render HTML template ---
+    return render_template(
+        _REPORT_TEMPLATE,
+        date=datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+        total_employees=stats.total_employees,
+        avg_performance=stats.avg_performance,
+        completed_goals=stats.completed_goals,
+        pending_goals=stats.pending_goals,
+        feedback_count=stats.feedback_count,
+        top_performers=stats.top_performers,
+        insights=insights_html,
+        fallback_summary=fallback_summary
+    )
 
-        # ==============================================================
-        #  ROBUST PDF GENERATION LOGIC (MULTI-PATH WKHTMLTOPDF HANDLER)
-        # ==============================================================
-        import shutil
 
-        candidates = [
-            os.environ.get("WKHTMLTOPDF_PATH"),
-            r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            shutil.which("wkhtmltopdf")
-        ]
+def _pdf_renderer():
+    try:
+        return get_renderer()
+    except PdfRenderError as e:
+        raise ReportGenerationError(str(e))
 
-        wk_path = None
-        for p in candidates:
-            if p and os.path.isfile(p):
-                wk_path = p
-                break
 
-        if not wk_path:
-            # return JSON explaining what was tried
-            return jsonify({
-                "success": False,
-                "error": "No wkhtmltopdf executable found. Tried: "
-                         + ", ".join([str(c) for c in candidates if c])
-                         + ". Please install wkhtmltopdf or set WKHTMLTOPDF_PATH environment variable.",
-            }), 500
+def generate_ai_report_pdf(manager_id=None):
+    """
+    Render the AI report and convert it to PDF. The PDF is archived by a
+    fingerprint of the report's inputs; if that fingerprint is already
+    archived the stored PDF is reused without calling the LLM.
+    Returns (pdf_bytes, pdf_filename, archive_path). Needs an app context.
+    """
+    stats, prompt = _ai_report_inputs(manager_id)
+
+    # --- Reuse the archived PDF if a report was made from the same inputs ---
+    fp = _ai_report_fingerprint(prompt)
+    archive_path = report_archive.lookup(fp)
+    if archive_path:
+        with open(archive_path, "rb") as f:
+            return f.read(), os.path.basename(archive_path), archive_path
+
+    pdf_bytes = _pdf_renderer().render(_render_ai_report_html(stats, prompt))
+
+    # --- Archive under the fingerprint (also applies the retention policy) ---
+    archive_path = report_archive.store(fp, pdf_bytes)
 
-        # Configure pdfkit
-        config = pdfkit.configuration(wkhtmltopdf=wk_path)
+    return pdf_bytes, os.path.basename(archive_path), archive_path
 
-        # Generate the PDF
-        pdf_bytes = pdfkit.from_string(rendered_html, False, configuration=config)
 
-        # --- Optionally save a copy in /reports ---
-        reports_dir = os.path.join(BASE_DIR, "reports")
-        os.makedirs(reports_dir, exist_ok=True)
-        pdf_filename = f"WorkWise_AI_Report_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.pdf"
-        archive_path = os.path.join(reports_dir, pdf_filename)
-        with open(archive_path, "wb") as f:
-            f.write(pdf_bytes)
+def generate_manager_report_pdfs(manager_ids=None):
+    """
+    One AI report per manager (all managers by default), converted up to
+    PDF_WORKERS at a time. Returns {manager_id: archive_path or error string}.
+    """
+    if manager_ids is None:
+        manager_ids = [m.id for m in User.query.filter_by(role="Manager").order_by(User.id)]
+    results, pending = {}, []
+    for manager_id in manager_ids:
+        stats, prompt = _ai_report_inputs(manager_id)
+        fp = _ai_report_fingerprint(prompt)
+        archive_path = report_archive.lookup(fp)
+        if archive_path:
+            results[manager_id] = archive_path
+        else:
+            pending.append((manager_id, fp, _render_ai_report_html(stats, prompt)))
+    if pending:
+        pdfs = _pdf_renderer().render_many([html for _, _, html in pending])
+        for (manager_id, fp, _), pdf in zip(pending, pdfs):
+            results[manager_id] = str(pdf) if isinstance(pdf, Exception) else report_archive.store(fp, pdf)
+    return results
+
+
+@app.route("/download_ai_report", methods=["GET"])
+def download_ai_report():
+    """Generate and return a PDF version of the latest AI Insights (PDF only, not on page)."""
+    try:
+        import io
+        from flask import send_file
+
+        pdf_bytes, pdf_filename, _ = generate_ai_report_pdf()
 
         # --- Send PDF as download ---
         return send_file(
@@ -1377,6 +2135,8 @@ def download_ai_report():
             as_attachment=True
         )
 
+    except ReportGenerationError as e:
+        return jsonify({"success": False, "error": str(e)}), 500
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1384,6 +2144,246 @@ def download_ai_report():
         }), 500
 
 
+# ==========================
+# BACKGROUND REPORT JOBS
+# ==========================
+# Job state lives in the instance folder (REPORT_JOBS_DB overrides). Jobs left
+# pending or running by a stopped process are resumed by the first request a
+# serving process handles, not at import, so 'flask' CLI commands never pick them up.
+from reports_local.jobs_local import JobQueue, DONE
+
+os.makedirs(app.instance_path, exist_ok=True)
+report_jobs = JobQueue(os.environ.get("REPORT_JOBS_DB") or os.path.join(app.instance_path, "jobs.db"))
+_report_jobs_resumed = threading.Event()
+
+
+def _ai_report_job():
+    with app.app_context():
+        _, _, archive_path = generate_ai_report_pdf()
+        return archive_path
+
+
+def _manager_reports_job(manager_ids=None):
+    """One report per manager, returned as a single zip."""
+    with app.app_context():
+        results = generate_manager_report_pdfs(manager_ids)
+    failed = {m: r for m, r in results.items() if not os.path.isfile(r)}
+    if failed:
+        raise ReportGenerationError(f"Reports failed for managers {sorted(failed)}: {next(iter(failed.values()))}")
+    return report_archive.store_bundle(list(results.values()))
+
+
+report_jobs.register("ai_report", _ai_report_job)
+report_jobs.register("manager_reports", _manager_reports_job)
+
+
+@app.before_request
+def _resume_report_jobs():
+    if not _report_jobs_resumed.is_set():
+        _report_jobs_resumed.set()
+        report_jobs.resume()
+
+
+def _job_json(job):
+    data = {k: job[k] for k in ("id", "kind", "status", "error", "created_at", "started_at",
+                                "finished_at", "duration_sec")}
+    if job["status"] == DONE:
+        data["download_url"] = url_for("ai_report_job_download", job_id=job["id"])
+    return data
+
+
+@app.route("/ai_report_jobs", methods=["POST"])
+@login_required
+def submit_ai_report_job():
+    """
+    Queue an AI report PDF; an identical pending/running job is reused.
+    {"kind": "manager_reports"} queues one report per manager instead, delivered as a zip.
+    """
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    try:
+        kind = (request.get_json(silent=True) or {}).get("kind", "ai_report")
+        if kind not in ("ai_report", "manager_reports"):
+            return jsonify({"success": False, "error": f"Unknown report kind: {kind}"}), 400
+        job, created = report_jobs.submit(kind)
+        resp = jsonify({"success": True, "created": created, "job": _job_json(job),
+                        "status_url": url_for("ai_report_job_status", job_id=job["id"])})
+        return resp, 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/ai_report_jobs/<job_id>", methods=["GET"])
+@login_required
+def ai_report_job_status(job_id):
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    resp = jsonify({"success": True, "job": _job_json(job)})
+    if job["status"] not in (DONE, "failed"):
+        resp.headers["Retry-After"] = "2"
+    return resp
+
+
+@app.route("/ai_report_jobs/<job_id>/download", methods=["GET"])
+@login_required
+def ai_report_job_download(job_id):
+    from flask import send_file
+
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    if job["status"] != DONE or not job["result_path"]:
+        return jsonify({"success": False, "error": f"Report not ready (status: {job['status']})"}), 409
+    if not os.path.isfile(job["result_path"]):
+        return jsonify({"success": False, "error": "Report was removed by the archive retention policy"}), 410
+    return send_file(
+        job["result_path"],
+        download_name=os.path.basename(job["result_path"]),
+        as_attachment=True
+    )
+
+
+@app.route("/ai_report_jobs/metrics", methods=["GET"])
+@login_required
+def ai_report_job_metrics():
+    """Queue depth and job duration metrics, plus PDF renderer counters."""
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    try:
+        pdf_stats = get_renderer().stats()
+    except PdfRenderError as e:
+        pdf_stats = {"error": str(e)}
+    return jsonify({"success": True, "metrics": report_jobs.metrics(), "pdf_renderer": pdf_stats})
+
+
+@app.route("/ai_reports", methods=["GET"])
+@login_required
+def list_ai_reports():
+    """Archived report PDFs, most recently used first."""
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    listing = report_archive.list()
+    for r in listing["reports"]:
+        r["download_url"] = url_for("download_archived_ai_report", name=r["name"])
+    return jsonify({"success": True, **listing})
+
+
+@app.route("/ai_reports/<name>", methods=["GET"])
+@login_required
+def download_archived_ai_report(name):
+    from flask import send_file
+
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    path = report_archive.resolve(name)
+    if not path:
+        return jsonify({"success": False, "error": "Report not found"}), 404
+    return send_file(path, download_name=os.path.basename(path), as_attachment=True)
+
+
+@app.cli.command("sweep-reports")
+def sweep_reports_command():
+    """Apply the report archive retention policy (REPORT_MAX_AGE_DAYS, REPORT_MAX_TOTAL_MB)."""
+    removed = report_archive.sweep()
+    click.echo(f"Removed {len(removed)} archived report(s)")
+    for name in removed:
+        click.echo(f"  {name}")
+
+
+# ==========================
+# ANALYTICS EXPORT
+# ==========================
+# Whole tables for analysts, streamed in chunks as Parquet / Arrow IPC (with
+# pyarrow) or gzip CSV: 'flask export-analytics' writes files,
+# /analytics/export/<table> streams one table to a manager.
+from reports_local.export_local import (
+    ExportStats, encode as export_encode, export_file, resolve_format as resolve_export_format,
+    have_pyarrow, FORMATS as EXPORT_FORMATS
+)
+
+EXPORT_TABLES = {
+    "employees": Employee.__table__,
+    "goals": Goal.__table__,
+    "bonuses": Bonus.__table__,
+    "feedback": Feedback.__table__,
+}
+# feedback is shown to employees anonymously, so the giver stays out of the export
+EXPORT_EXCLUDED_COLUMNS = {"feedback": {"giver_id"}}
+
+last_exports = {}  # table -> ExportStats of the latest export in this process
+
+
+def _export_columns(name):
+    excluded = EXPORT_EXCLUDED_COLUMNS.get(name, set())
+    return [column for column in EXPORT_TABLES[name].columns if column.name not in excluded]
+
+
+@app.route("/analytics/export", methods=["GET"])
+@login_required
+def analytics_exports():
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    return jsonify({
+        "success": True,
+        "tables": sorted(EXPORT_TABLES),
+        "formats": [fmt for fmt in EXPORT_FORMATS if fmt == "csv" or have_pyarrow()],
+        "default_format": resolve_export_format(),
+        "last_exports": {name: stats.to_dict() for name, stats in last_exports.items()},
+    })
+
+
+@app.route("/analytics/export/<name>", methods=["GET"])
+@login_required
+def analytics_export(name):
+    if get_user_by_id(session["user_id"]).role != "Manager":
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+    if name not in EXPORT_TABLES:
+        return jsonify({"success": False, "error": "Unknown table"}), 404
+    try:
+        fmt = resolve_export_format(request.args.get("format"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    stats = ExportStats(name, fmt)
+
+    def generate():
+        with db.engine.connect() as conn:
+            yield from export_encode(conn, EXPORT_TABLES[name], _export_columns(name), fmt, stats=stats)
+        last_exports[name] = stats
+        app.logger.info("Exported %s: %d rows as %s in %.2fs (%.0f rows/sec)",
+                        name, stats.rows, fmt, stats.seconds, stats.rows_per_sec)
+
+    suffix, mimetype = EXPORT_FORMATS[fmt]
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={name}{suffix}", "X-Export-Format": fmt}
+    )
+
+
+@app.cli.command("export-analytics")
+@click.option("--out", "directory", default=os.path.join(BASE_DIR, "exports"), show_default=True)
+@click.option("--format", "fmt", type=click.Choice(list(EXPORT_FORMATS)), default=None,
+              help="Default: EXPORT_FORMAT, else parquet with pyarrow installed, else csv.")
+@click.option("--table", "tables", multiple=True, type=click.Choice(list(EXPORT_TABLES)),
+              help="Repeat to pick tables (default: all).")
+def export_analytics_command(directory, fmt, tables):
+    """Export employees, goals, bonuses and feedback for analysis, reporting rows/sec."""
+    if fmt and resolve_export_format(fmt) != fmt:
+        click.echo(f"pyarrow is not installed; writing gzip CSV instead of {fmt}")
+    for name in tables or EXPORT_TABLES:
+        with db.engine.connect() as conn:
+            path, stats = export_file(conn, EXPORT_TABLES[name], directory, _export_columns(name), fmt, name=name)
+        last_exports[name] = stats
+        click.echo(f"{name}: {stats.rows} rows, {stats.bytes / 1024:.1f} KiB in {stats.seconds:.2f}s "
+                   f"({stats.rows_per_sec:.0f} rows/sec) -> {path}")
+
+
 
 # ==========================
 # RUN APP
@@ -1391,8 +2391,14 @@ def download_ai_report():
 
 if __name__ == "__main__":
     with app.app_context():
-        if not os.path.exists(os.path.join(BASE_DIR, "workwise.db")):
+        if not os.path.exists(DB_PATH):
             init_db()
         else:
             print("ℹ️  Database already exists. Delete 'workwise.db' to reinitialize.")
+        for version in migrate_db():
+            print(f"✅ Applied migration {version}")
+    try:
+        print(f"ℹ️  PDF reports via {get_renderer().executable}")
+    except PdfRenderError as e:
+        print(f"⚠️  {e}")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,147 @@
+# archive_local.py
+# Content-addressed archive of generated PDF reports, with size/age retention
+#
+# A report is stored as <prefix><fingerprint>.pdf, where the fingerprint is a
+# sha256 the caller computes from the report's inputs, so a report made from
+# the same inputs again is served from the archive without being rebuilt.
+# Serving a report refreshes its mtime, so the sweeper evicts the least
+# recently used reports first. Listing, serving and sweeping only ever consider
+# file names the archive itself writes; give it a directory of its own.
+
+from datetime import datetime
+import threading
+import zipfile
+import hashlib
+import time
+import os
+import re
+
+REPORT_MAX_AGE_DAYS = float(os.getenv("REPORT_MAX_AGE_DAYS", "30"))
+REPORT_MAX_TOTAL_MB = float(os.getenv("REPORT_MAX_TOTAL_MB", "200"))
+
+_FINGERPRINT_CHARS = 24
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:_FINGERPRINT_CHARS]
+
+
+class ReportArchive:
+    def __init__(self, directory, prefix="WorkWise_AI_Report_",
+                 max_age_days=REPORT_MAX_AGE_DAYS, max_total_mb=REPORT_MAX_TOTAL_MB):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_age = max_age_days * 86400 if max_age_days > 0 else None
+        self.max_total = int(max_total_mb * 1024 * 1024) if max_total_mb > 0 else None
+        self._lock = threading.Lock()
+        # <prefix><fp>.pdf from store(), <prefix>batch_<fp>.zip from store_bundle()
+        self._names = re.compile(
+            rf"{re.escape(prefix)}(?:[0-9a-f]{{{_FINGERPRINT_CHARS}}}\.pdf|batch_[0-9a-f]{{{_FINGERPRINT_CHARS}}}\.zip)"
+        )
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, fp):
+        return os.path.join(self.directory, f"{self.prefix}{fp}.pdf")
+
+    def lookup(self, fp):
+        """Return the archived PDF path for this fingerprint (touching it), or None."""
+        path = self.path_for(fp)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, fp, pdf_bytes):
+        """Write the PDF atomically under its fingerprint, then apply retention."""
+        path = self.path_for(fp)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, path)
+        self.sweep(keep=path)
+        return path
+
+    def store_bundle(self, paths):
+        """Zip archived reports together (e.g. one per manager); the bundle is archived too."""
+        names = sorted(os.path.basename(p) for p in paths)
+        fp = fingerprint("\n".join(names))
+        path = os.path.join(self.directory, f"{self.prefix}batch_{fp}.zip")
+        if os.path.isfile(path):
+            os.utime(path)
+            return path
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:  # PDFs are already compressed
+            for p in paths:
+                zf.write(p, os.path.basename(p))
+        os.replace(tmp, path)
+        self.sweep(keep=path)
+        return path
+
+    def resolve(self, name):
+        """Archive path for a listed file name, or None (never escapes the directory)."""
+        name = os.path.basename(name)
+        path = os.path.join(self.directory, name)
+        if not self._names.fullmatch(name) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not self._names.fullmatch(name):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((name, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2], reverse=True)
+        return entries
+
+    def list(self):
+        entries = self._entries()
+        return {
+            "total_bytes": sum(size for _, size, _ in entries),
+            "count": len(entries),
+            "reports": [
+                {
+                    "name": name,
+                    "size_bytes": size,
+                    "last_used": datetime.utcfromtimestamp(mtime).isoformat(),
+                }
+                for name, size, mtime in entries
+            ],
+        }
+
+    def sweep(self, keep=None):
+        """
+        Delete reports unused for longer than max_age, then the least recently
+        used ones until the archive fits in max_total. Returns names removed.
+        """
+        removed = []
+        with self._lock:
+            now = time.time()
+            entries = self._entries()
+            kept, total = [], 0
+            for name, size, mtime in entries:
+                path = os.path.join(self.directory, name)
+                if path != keep and self.max_age is not None and now - mtime > self.max_age:
+                    removed.append(name)
+                else:
+                    kept.append((name, size, mtime))
+                    total += size
+            if self.max_total is not None:
+                for name, size, _ in reversed(kept):  # oldest first
+                    if total <= self.max_total:
+                        break
+                    if os.path.join(self.directory, name) == keep:
+                        continue
+                    removed.append(name)
+                    total -= size
+            for name in removed:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        return removed
@@ -0,0 +1,193 @@
+# export_local.py
+# Streaming analytics export of whole tables: Parquet / Arrow IPC via pyarrow when installed, gzip CSV otherwise
+#
+# Rows come from one SELECT iterated with yield_per, EXPORT_CHUNK_ROWS at a
+# time, and each chunk is encoded (a Parquet row group, an Arrow record batch
+# or a block of CSV lines) and handed on before the next is fetched, so memory
+# stays flat whatever the table size. encode() yields the encoded bytes, which
+# export_file() writes to disk and the Flask endpoint streams as the response.
+# Tables are passed in so this module does not import the Flask app.
+
+from dataclasses import dataclass, asdict
+from datetime import date, datetime
+import importlib.util
+import gzip
+import csv
+import io
+import os
+import time
+
+from sqlalchemy import select
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "")  # parquet | arrow | csv; empty: parquet if pyarrow is installed
+
+# format -> (file suffix, mimetype)
+FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+    "csv": (".csv.gz", "application/gzip"),
+}
+
+
+def have_pyarrow():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def resolve_format(requested=None):
+    """The format to write: requested (or EXPORT_FORMAT), falling back to csv when pyarrow is missing."""
+    fmt = (requested or EXPORT_FORMAT or "parquet").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    if fmt != "csv" and not have_pyarrow():
+        return "csv"
+    return fmt
+
+
+@dataclass
+class ExportStats:
+    table: str
+    format: str
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return dict(asdict(self), rows_per_sec=round(self.rows_per_sec, 1))
+
+
+class _Sink:
+    """Write-only file object the encoders write into; drain() hands over what has accumulated."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _arrow_type(pa, column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp("us")
+    if python_type is date:
+        return pa.date32()
+    return pa.string()
+
+
+class _CsvWriter:
+    def __init__(self, sink, columns):
+        self._text = io.TextIOWrapper(gzip.GzipFile(fileobj=sink, mode="wb"), encoding="utf-8", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow([column.name for column in columns])
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+        self._text.flush()
+
+    def close(self):
+        self._text.close()  # closes the GzipFile (writing its trailer), not the sink
+
+
+class _ArrowWriter:
+    def __init__(self, sink, columns, fmt):
+        import pyarrow as pa
+
+        self._pa = pa
+        self._schema = pa.schema([(column.name, _arrow_type(pa, column)) for column in columns])
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(sink, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(sink, self._schema)
+
+    def write(self, rows):
+        pa = self._pa
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self._schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def encode(conn, table, columns=None, fmt=None, chunk=EXPORT_CHUNK_ROWS, stats=None):
+    """
+    Yield table (optionally only `columns`) encoded as fmt, one piece per
+    chunk of rows, in primary-key order. Fills in `stats` (ExportStats) as it goes.
+    """
+    fmt = resolve_format(fmt)
+    columns = list(columns if columns is not None else table.columns)
+    stats = stats if stats is not None else ExportStats(table.name, fmt)
+    stats.format = fmt
+    start = time.perf_counter()
+    sink = _Sink()
+    writer = _CsvWriter(sink, columns) if fmt == "csv" else _ArrowWriter(sink, columns, fmt)
+    result = conn.execution_options(yield_per=chunk).execute(
+        select(*columns).order_by(*table.primary_key.columns)
+    )
+    for rows in result.partitions():
+        writer.write(rows)
+        stats.rows += len(rows)
+        data = sink.drain()
+        if data:
+            stats.bytes += len(data)
+            yield data
+    writer.close()
+    data = sink.drain()
+    stats.bytes += len(data)
+    stats.seconds = time.perf_counter() - start
+    if data:
+        yield data
+
+
+def export_file(conn, table, directory, columns=None, fmt=None, chunk=EXPORT_CHUNK_ROWS, name=None):
+    """Write table to <directory>/<name or table name><suffix> (atomically). Returns (path, ExportStats)."""
+    fmt = resolve_format(fmt)
+    name = name or table.name
+    stats = ExportStats(name, fmt)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + FORMATS[fmt][0])
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            for data in encode(conn, table, columns, fmt, chunk, stats):
+                f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path, stats
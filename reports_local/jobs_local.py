@@ -0,0 +1,211 @@
+# jobs_local.py
+# Local background job queue: thread pool workers, job state persisted in SQLite
+#
+# Handlers are registered per job kind and return the path of the file they
+# produced. Submitting a job identical (same kind + params) to one that is still
+# pending or running returns the existing job instead of queueing another.
+# Several processes may share one database: a worker claims a job atomically
+# before running it and heartbeats it while it runs, and resume() re-queues
+# pending jobs and running jobs whose heartbeat stopped (their process died).
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import sqlite3
+import hashlib
+import json
+import math
+import time
+import logging
+import uuid
+import os
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_HEARTBEAT_SEC = float(os.getenv("JOB_HEARTBEAT_SEC", "10"))
+# A running job whose heartbeat is older than this many intervals is presumed dead
+_STALE_HEARTBEATS = 3
+# How many finished job durations are kept for the metrics endpoint
+_DURATION_WINDOW = 200
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result_path TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    duration_sec REAL,
+    heartbeat_at TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_dedupe_status ON jobs (dedupe_key, status);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status);
+"""
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+class JobQueue:
+    def __init__(self, db_path, workers=JOB_WORKERS, heartbeat_sec=JOB_HEARTBEAT_SEC):
+        self.db_path = db_path
+        self.heartbeat_sec = heartbeat_sec
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="job-worker")
+        self._queued = set()  # ids submitted to this process's pool and not finished
+        self._running = set()  # ids this process is running (and heartbeating)
+        self._heartbeat = None
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at TEXT")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        """handler(**params) -> path of the produced file"""
+        self._handlers[kind] = handler
+
+    def resume(self):
+        """
+        Re-queue pending jobs and running jobs whose worker stopped heartbeating,
+        then keep heartbeating this process's jobs and re-checking every
+        heartbeat_sec. Returns the number of jobs queued now.
+        """
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return self._requeue()
+
+    def _requeue(self):
+        stale = (datetime.utcnow() - timedelta(seconds=self.heartbeat_sec * _STALE_HEARTBEATS)).isoformat()
+        with self._lock, self._conn() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL"
+                " WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (PENDING, RUNNING, stale)
+            )
+            ids = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (PENDING,)
+            ) if row["id"] not in self._queued]
+        for job_id in ids:
+            self._enqueue(job_id)
+        return len(ids)
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat_sec)
+            try:
+                with self._lock:
+                    running = list(self._running)
+                if running:
+                    with self._conn() as conn:
+                        conn.execute(
+                            f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({', '.join('?' * len(running))})",
+                            (_now(), *running)
+                        )
+                self._requeue()
+            except sqlite3.Error as e:
+                logger.warning("Job heartbeat failed: %s", e)
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            self._queued.add(job_id)
+        self._pool.submit(self._run, job_id)
+
+    def submit(self, kind, params=None):
+        """Queue a job, or return the identical job that is already pending/running."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        params = params or {}
+        params_json = json.dumps(params, sort_keys=True)
+        dedupe_key = hashlib.sha256(f"{kind}\x00{params_json}".encode("utf-8")).hexdigest()
+        with self._lock, self._conn() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (dedupe_key, PENDING, RUNNING)
+            ).fetchone()
+            if row is not None:
+                return dict(row), False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, dedupe_key, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, params_json, dedupe_key, PENDING, _now())
+            )
+        self._enqueue(job_id)
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _run(self, job_id):
+        try:
+            # claim: only one worker (in any process) moves a job out of pending
+            now = _now()
+            with self._lock, self._conn() as conn:
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, now, now, job_id, PENDING)
+                ).rowcount
+                if claimed:
+                    self._running.add(job_id)
+            if not claimed:
+                return
+            job = self.get(job_id)
+            start = time.perf_counter()
+            try:
+                path = self._handlers[job["kind"]](**json.loads(job["params"]))
+                status, error = DONE, None
+            except Exception as e:
+                path, status, error = None, FAILED, str(e)
+            with self._conn() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result_path = ?, error = ?, finished_at = ?, duration_sec = ?"
+                    " WHERE id = ?",
+                    (status, path, error, _now(), round(time.perf_counter() - start, 3), job_id)
+                )
+        finally:
+            with self._lock:
+                self._queued.discard(job_id)
+                self._running.discard(job_id)
+
+    def metrics(self):
+        conn = self._conn()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        durations = sorted(
+            r["duration_sec"] for r in conn.execute(
+                "SELECT duration_sec FROM jobs WHERE status = ? ORDER BY finished_at DESC LIMIT ?",
+                (DONE, _DURATION_WINDOW)
+            )
+        )
+        return {
+            "queue_depth": counts[PENDING],
+            "running": counts[RUNNING],
+            "done": counts[DONE],
+            "failed": counts[FAILED],
+            "duration_avg_sec": round(sum(durations) / len(durations), 3) if durations else None,
+            "duration_p95_sec": durations[min(len(durations) - 1, math.ceil(len(durations) * 0.95) - 1)] if durations else None,
+        }
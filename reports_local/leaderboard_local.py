@@ -0,0 +1,144 @@
+# leaderboard_local.py
+# In-memory leaderboard: one sorted key list per (sort option, position), updated row by row
+#
+# Reads bisect to the keyset cursor and slice one page, so a page costs
+# O(log n + page size) whatever the headcount; ranks follow SQL RANK() (ties
+# share a rank). Writes move only the changed employee's keys. The index lives
+# in this process, so changes made outside it (another worker, raw SQL) are
+# caught by comparing `version` (whatever the caller read from the table at
+# rebuild time) with the table, or by check(), and repaired by rebuild().
+
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+import threading
+
+# sort option -> (row field, descending)
+SORTS = {
+    "performance_desc": ("performance_score", True),
+    "performance_asc": ("performance_score", False),
+    "commits_desc": ("commits", True),
+    "commits_asc": ("commits", False),
+}
+
+Entry = namedtuple("Entry", "id name position performance_score commits")
+LeaderboardRow = namedtuple("LeaderboardRow", "id name position performance_score commits sort_value rank")
+
+
+def _sort_value(entry, field):
+    return getattr(entry, field) or 0
+
+
+class LeaderboardIndex:
+    def __init__(self):
+        self._entries = {}  # employee id -> Entry
+        self._lists = {}    # (sort option, position or None) -> sorted [(signed value, id)]
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.version = None  # table version the index was built from; None once edited in place
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _slots(self, entry):
+        for sort_option, (field, descending) in SORTS.items():
+            value = _sort_value(entry, field)
+            key = (-value if descending else value, entry.id)
+            yield (sort_option, None), key
+            if entry.position:
+                yield (sort_option, entry.position), key
+
+    def _add(self, entry):
+        self._entries[entry.id] = entry
+        for slot, key in self._slots(entry):
+            insort(self._lists.setdefault(slot, []), key)
+
+    def _discard(self, employee_id):
+        entry = self._entries.pop(employee_id, None)
+        if entry is None:
+            return
+        for slot, key in self._slots(entry):
+            keys = self._lists[slot]
+            del keys[bisect_left(keys, key)]
+            if not keys:
+                del self._lists[slot]
+
+    def rebuild(self, entries, version=None):
+        """Replace the whole index with entries (Entry tuples) read at table version `version`."""
+        with self._lock:
+            self._entries, self._lists = {}, {}
+            for entry in entries:
+                self._entries[entry.id] = entry
+                for slot, key in self._slots(entry):
+                    self._lists.setdefault(slot, []).append(key)
+            for keys in self._lists.values():
+                keys.sort()
+            self.loaded = True
+            self.version = version
+
+    def apply(self, changed_ids, entries):
+        """Incremental update: entries are the current rows for changed_ids; ids without one were deleted."""
+        with self._lock:
+            self.version = None
+            for employee_id in changed_ids:
+                self._discard(employee_id)
+            for entry in entries:
+                self._add(entry)
+
+    def page(self, position=None, sort_option="performance_desc", after=None, limit=50):
+        """Returns (rows, next_cursor or None); `after` is the previous page's cursor."""
+        field, descending = SORTS[sort_option]
+        with self._lock:
+            keys = self._lists.get((sort_option, position or None), [])
+            start = 0
+            if after:
+                try:
+                    value, employee_id = (int(x) for x in after.split(":", 1))
+                    start = bisect_right(keys, (-value if descending else value, employee_id))
+                except ValueError:
+                    pass
+            rows = []
+            for signed, employee_id in keys[start:start + limit]:
+                entry = self._entries[employee_id]
+                rank = bisect_left(keys, (signed,)) + 1
+                rows.append(LeaderboardRow(*entry, _sort_value(entry, field), rank))
+            next_cursor = None
+            if start + limit < len(keys) and rows:
+                next_cursor = f"{rows[-1].sort_value}:{rows[-1].id}"
+            return rows, next_cursor
+
+    def rank(self, employee_id, sort_option="performance_desc"):
+        field, descending = SORTS[sort_option]
+        with self._lock:
+            entry = self._entries.get(employee_id)
+            if entry is None:
+                return 0
+            value = _sort_value(entry, field)
+            return bisect_left(self._lists[(sort_option, None)], (-value if descending else value,)) + 1
+
+    def positions(self):
+        with self._lock:
+            return sorted({position for _, position in self._lists if position})
+
+    def check(self, entries):
+        """
+        Compare the index with the authoritative rows. Returns a list of
+        human-readable discrepancies (empty when consistent).
+        """
+        expected = LeaderboardIndex()
+        expected.rebuild(entries)
+        problems = []
+        with self._lock:
+            missing = expected._entries.keys() - self._entries.keys()
+            extra = self._entries.keys() - expected._entries.keys()
+            if missing:
+                problems.append(f"missing employees: {sorted(missing)[:20]}")
+            if extra:
+                problems.append(f"stale employees: {sorted(extra)[:20]}")
+            changed = [i for i in expected._entries.keys() & self._entries.keys()
+                       if expected._entries[i] != self._entries[i]]
+            if changed:
+                problems.append(f"outdated rows: {sorted(changed)[:20]}")
+            for slot in expected._lists.keys() | self._lists.keys():
+                if expected._lists.get(slot) != self._lists.get(slot):
+                    problems.append(f"order differs for {slot[0]} / {slot[1] or 'All Roles'}")
+        return problems
@@ -0,0 +1,96 @@
+# migrations_local.py
+# Run-once schema migrations for an existing SQLite database, recorded in schema_migrations
+#
+# db.create_all() only creates missing tables, so an existing workwise.db never
+# picks up new indexes or columns. migrate() runs each (version, callable) pair
+# once, in list order, in its own transaction, and records the version in
+# schema_migrations. Append new migrations; never edit one that has shipped.
+# Metadata and tables are passed in so this module does not import the Flask app.
+
+from datetime import datetime, timedelta
+import pickle
+import sqlite3
+import re
+
+from sqlalchemy.schema import CreateIndex
+
+
+def migrate(engine, migrations):
+    """Apply the pending migrations. Returns the versions applied."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version TEXT PRIMARY KEY, applied_at TEXT NOT NULL)"
+        )
+        done = {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+    applied = []
+    for version, migration in migrations:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, applied_at) VALUES (?, ?)",
+                (version, datetime.utcnow().isoformat())
+            )
+        applied.append(version)
+    return applied
+
+
+def _columns(conn, table_name):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table_name})")}
+
+
+def create_missing_indexes(conn, metadata):
+    # IF NOT EXISTS rather than checkfirst: reflection can't see expression indexes
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def drop_indexes(conn, names):
+    for name in names:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def move_pickled_activities(conn, activities):
+    """employees.recent_activities (pickled list of {"action", "time_ago"}) -> rows of the activities table."""
+    if "recent_activities" not in _columns(conn, "employees"):
+        return
+    now = datetime.utcnow()
+    units = {"minute": "minutes", "hour": "hours", "day": "days", "week": "weeks"}
+    rows = []
+    for employee_id, blob in conn.exec_driver_sql(
+            "SELECT id, recent_activities FROM employees WHERE recent_activities IS NOT NULL"):
+        try:
+            items = pickle.loads(blob) or []
+        except Exception:
+            continue
+        # the list is newest first; keep that order when the text has no usable age
+        for i, activity in enumerate(items):
+            ts = now - timedelta(microseconds=i)
+            m = re.match(r"(\d+)\s+(minute|hour|day|week)s?\s+ago", str(activity.get("time_ago", "")))
+            if m:
+                ts = now - timedelta(**{units[m.group(2)]: int(m.group(1))}, microseconds=i)
+            rows.append({"employee_id": employee_id, "action": str(activity.get("action", "Activity"))[:200],
+                         "timestamp": ts})
+    if rows:
+        conn.execute(activities.insert(), rows)
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.exec_driver_sql("ALTER TABLE employees DROP COLUMN recent_activities")
+    else:
+        conn.exec_driver_sql("UPDATE employees SET recent_activities = NULL")
+
+
+def add_performance_team_columns(conn):
+    """manager_id / department on performance_weeks, filled from each employee's current team."""
+    present = _columns(conn, "performance_weeks")
+    if "manager_id" not in present:
+        conn.exec_driver_sql("ALTER TABLE performance_weeks ADD COLUMN manager_id INTEGER")
+    if "department" not in present:
+        conn.exec_driver_sql("ALTER TABLE performance_weeks ADD COLUMN department VARCHAR(50)")
+    conn.exec_driver_sql(
+        "UPDATE performance_weeks SET"
+        " manager_id = (SELECT manager_id FROM employees WHERE employees.id = performance_weeks.employee_id),"
+        " department = (SELECT department FROM employees WHERE employees.id = performance_weeks.employee_id)"
+        " WHERE manager_id IS NULL AND department IS NULL"
+    )
@@ -0,0 +1,129 @@
+# pdf_bounded_local.py
+# HTML -> PDF with wkhtmltopdf, with bounded concurrency and a per-render timeout
+#
+# This is not a pool of long-lived renderers: wkhtmltopdf has no server mode,
+# so every render still starts one wkhtmltopdf process, as before. What this
+# adds is that at most PDF_WORKERS conversions run at a time (extra renders
+# queue instead of piling up processes), a render that hangs is killed after
+# PDF_RENDER_TIMEOUT seconds, and the executable is looked up once. HTML is
+# piped over stdin and the PDF read from stdout, so no temp files are involved.
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import threading
+import shutil
+import time
+import os
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+class PdfRenderError(Exception):
+    """wkhtmltopdf is missing, failed, or timed out."""
+
+
+def wkhtmltopdf_candidates():
+    return [
+        os.environ.get("WKHTMLTOPDF_PATH"),
+        r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
+        shutil.which("wkhtmltopdf")
+    ]
+
+
+def find_wkhtmltopdf():
+    """Return the first existing wkhtmltopdf executable, or raise PdfRenderError."""
+    candidates = wkhtmltopdf_candidates()
+    for p in candidates:
+        if p and os.path.isfile(p):
+            return p
+    raise PdfRenderError(
+        "No wkhtmltopdf executable found. Tried: "
+        + ", ".join([str(c) for c in candidates if c])
+        + ". Please install wkhtmltopdf or set WKHTMLTOPDF_PATH environment variable."
+    )
+
+
+class PdfRenderer:
+    def __init__(self, executable, workers=PDF_WORKERS, timeout=PDF_RENDER_TIMEOUT):
+        self.executable = executable
+        self.workers = max(1, int(workers))
+        self.timeout = float(timeout)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-render")
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.render_sec = 0.0
+
+    def _convert(self, html, timeout):
+        start = time.perf_counter()
+        try:
+            proc = subprocess.run(
+                [self.executable, "--quiet", "--encoding", "utf-8", "-", "-"],
+                input=html.encode("utf-8"),
+                capture_output=True,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            with self._lock:
+                self.failed += 1
+                self.timeouts += 1
+            raise PdfRenderError(f"wkhtmltopdf timed out after {timeout:g}s")
+        # exit code 1 with a PDF on stdout means warnings (e.g. an unreachable asset)
+        if proc.returncode not in (0, 1) or not proc.stdout.startswith(b"%PDF"):
+            with self._lock:
+                self.failed += 1
+            stderr = proc.stderr.decode("utf-8", "replace").strip()
+            raise PdfRenderError(f"wkhtmltopdf exited with code {proc.returncode}: {stderr}")
+        with self._lock:
+            self.rendered += 1
+            self.render_sec += time.perf_counter() - start
+        return proc.stdout
+
+    def render(self, html, timeout=None):
+        """Convert one HTML document to PDF bytes, waiting for a free worker."""
+        return self._pool.submit(self._convert, html, timeout or self.timeout).result()
+
+    def render_many(self, htmls, timeout=None):
+        """
+        Convert several documents across the pool. Returns a list in input
+        order holding PDF bytes, or the PdfRenderError for a failed document.
+        """
+        futures = [self._pool.submit(self._convert, html, timeout or self.timeout) for html in htmls]
+        results = []
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except PdfRenderError as e:
+                results.append(e)
+        return results
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool; renders already submitted still finish when wait is true."""
+        self._pool.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executable": self.executable,
+                "workers": self.workers,
+                "timeout_sec": self.timeout,
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "avg_render_sec": round(self.render_sec / self.rendered, 3) if self.rendered else None,
+            }
+
+
+def get_renderer():
+    """Process-wide renderer; the executable is looked up on first use only."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PdfRenderer(find_wkhtmltopdf())
+    return _renderer
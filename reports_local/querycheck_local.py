@@ -0,0 +1,73 @@
+# querycheck_local.py
+# The SQL each route issues: statements captured per request, and full table scans among them
+#
+# route_statements() requests routes through a Flask test client, logged in as
+# one user per role, and records the response status and every statement the
+# engine executed for each request. The tests in tests/ count those statements
+# (a count that grows with the row count is an N+1) and pass them to
+# full_scans(), which runs EXPLAIN QUERY PLAN on the filtered SELECTs. The
+# client, engine and users are passed in so this module does not import the
+# Flask app.
+
+from collections import namedtuple
+import re
+
+from sqlalchemy import event
+
+RouteRun = namedtuple("RouteRun", "status statements")  # statements: [(sql, parameters)]
+
+
+def route_statements(client, engine, users, routes, before_request=None):
+    """
+    users: {role: user id}; routes: {role: [url]}. Returns {(role, url): RouteRun}
+    for the roles that have a user. before_request (e.g. dropping the ORM
+    session) runs before each request and is not captured.
+    """
+    runs, current = {}, {"key": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current["key"] is not None:
+            runs[current["key"]].statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for role, urls in routes.items():
+            if role not in users:
+                continue
+            with client.session_transaction() as sess:
+                sess["user_id"], sess["role"] = users[role], role
+            for url in urls:
+                if before_request is not None:
+                    before_request()
+                key = (role, url)
+                runs[key] = RouteRun(None, [])
+                current["key"] = key
+                try:
+                    response = client.get(url)
+                    response.close()
+                finally:
+                    current["key"] = None
+                runs[key] = runs[key]._replace(status=response.status_code)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return runs
+
+
+def full_scans(conn, statements, tables):
+    """
+    [(table, sql)] for the filtered SELECTs among statements whose plan scans
+    one of tables. Unfiltered queries (e.g. whole-table aggregates) scan by
+    design and are not reported.
+    """
+    scans, seen = [], set()
+    for statement, parameters in statements:
+        if statement in seen or not statement.lstrip().upper().startswith("SELECT"):
+            continue
+        seen.add(statement)
+        if not re.search(r"\bWHERE\b", statement, re.I):
+            continue
+        for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+            m = re.match(r"SCAN (\w+)(?: AS \w+)?$", row[-1])
+            if m and m.group(1) in tables:
+                scans.append((m.group(1), " ".join(statement.split())))
+    return scans
@@ -0,0 +1,174 @@
+# rollups_local.py
+# Weekly and monthly per-manager / per-department sums of the weekly performance points
+#
+# A rollup row holds sums (points, score, commits, goals planned / completed)
+# for one (scope, key, period, period start), so averages are sum / points and
+# a changed point is applied as a delta: apply() subtracts the point it replaced
+# and adds the new one, touching a handful of rows however big the org is.
+# Points count towards the manager and department stored on the point, i.e. the
+# team the employee was in that week; a month holds the weeks whose Monday falls
+# in it. expected() recomputes everything with GROUP BY for backfill() and check().
+
+from collections import namedtuple
+from datetime import datetime, date
+import os
+
+from sqlalchemy import Date, func, select, and_, delete, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+ROLLUP_LOAD_CHUNK = int(os.getenv("ROLLUP_LOAD_CHUNK", "5000"))
+
+SCOPES = ("manager", "department")
+PERIODS = ("week", "month")
+
+_KEY = ("scope", "scope_key", "period", "period_start")
+_SUMS = ("points", "score_sum", "commits_sum", "goals_planned", "goals_completed")
+
+
+class Rollup(namedtuple("Rollup", _SUMS)):
+    __slots__ = ()
+
+    @property
+    def avg_score(self):
+        return self.score_sum / self.points if self.points else 0
+
+    @property
+    def completion_rate(self):
+        return self.goals_completed / self.goals_planned * 100 if self.goals_planned else 0
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def months_ending(day, n):
+    """The n month starts up to and including day's month, oldest first."""
+    index = day.year * 12 + day.month - 1
+    return [date((index - k) // 12, (index - k) % 12 + 1, 1) for k in range(n - 1, -1, -1)]
+
+
+def _slots(point):
+    starts = (("week", point.week_start), ("month", month_start(point.week_start)))
+    for period, start in starts:
+        if point.manager_id is not None:
+            yield ("manager", str(point.manager_id), period, start)
+        if point.department:
+            yield ("department", point.department, period, start)
+
+
+def _contribution(point):
+    return (1, point.performance_score or 0, point.commits or 0, point.goals_planned or 0, point.goals_completed or 0)
+
+
+def apply(conn, table, before, after):
+    """
+    before / after: the points a load replaced / wrote (timeseries_local.Point).
+    Returns the number of rollup rows changed.
+    """
+    deltas = {}
+    for sign, points in ((-1, before), (1, after)):
+        for point in points:
+            values = _contribution(point)
+            for slot in _slots(point):
+                acc = deltas.setdefault(slot, [0] * len(_SUMS))
+                for i, value in enumerate(values):
+                    acc[i] += sign * value
+    rows = [dict(zip(_KEY + _SUMS, slot + tuple(sums)), updated_at=datetime.utcnow())
+            for slot, sums in deltas.items() if any(sums)]
+    if not rows:
+        return 0
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in _KEY],
+        set_=dict({name: table.c[name] + stmt.excluded[name] for name in _SUMS}, updated_at=stmt.excluded.updated_at),
+    )
+    conn.execute(stmt, rows)
+    emptied = [{"k_" + name: row[name] for name in _KEY} for row in rows if row["points"] < 0]
+    if emptied:
+        conn.execute(
+            delete(table).where(table.c.points <= 0, *(table.c[name] == bindparam("k_" + name) for name in _KEY)),
+            emptied,
+        )
+    return len(rows)
+
+
+def expected(conn, points):
+    """{(scope, key, period, period start): Rollup} recomputed from the points table."""
+    month = func.date(points.c.week_start, "start of month", type_=Date)
+    result = {}
+    for scope, column, present in (
+        ("manager", points.c.manager_id, points.c.manager_id.is_not(None)),
+        ("department", points.c.department, func.coalesce(points.c.department, "") != ""),
+    ):
+        for period, start in (("week", points.c.week_start), ("month", month)):
+            query = (
+                select(column, start, func.count(), func.sum(points.c.performance_score),
+                       func.sum(points.c.commits), func.sum(points.c.goals_planned),
+                       func.sum(points.c.goals_completed))
+                .where(present)
+                .group_by(column, start)
+            )
+            for key, period_start, *sums in conn.execute(query):
+                result[(scope, str(key), period, period_start)] = Rollup(*(int(s or 0) for s in sums))
+    return result
+
+
+def stored(conn, table):
+    return {
+        tuple(row[:4]): Rollup(*row[4:])
+        for row in conn.execute(select(*(table.c[name] for name in _KEY + _SUMS)))
+    }
+
+
+def backfill(conn, table, points, chunk=ROLLUP_LOAD_CHUNK):
+    """Replace every rollup row with a recomputation from the points table. Returns the row count."""
+    rows = [dict(zip(_KEY + _SUMS, slot + tuple(sums)), updated_at=datetime.utcnow())
+            for slot, sums in expected(conn, points).items()]
+    conn.execute(delete(table))
+    for i in range(0, len(rows), chunk):
+        conn.execute(table.insert(), rows[i:i + chunk])
+    return len(rows)
+
+
+def check(conn, table, points):
+    """
+    Compare the stored rollups with a recomputation. Returns a list of
+    human-readable discrepancies (empty when consistent).
+    """
+    want, have = expected(conn, points), stored(conn, table)
+    problems = []
+    missing = sorted(want.keys() - have.keys())
+    extra = sorted(have.keys() - want.keys())
+    changed = sorted(k for k in want.keys() & have.keys() if want[k] != have[k])
+    if missing:
+        problems.append(f"missing rollups: {missing[:20]}")
+    if extra:
+        problems.append(f"stale rollups: {extra[:20]}")
+    if changed:
+        problems.append(f"outdated rollups: {changed[:20]}")
+    return problems
+
+
+def _in_range(table, scope, key, period, starts):
+    return and_(table.c.scope == scope, table.c.scope_key == str(key), table.c.period == period,
+                table.c.period_start.between(starts[0], starts[-1]))
+
+
+def series(conn, table, scope, key, period, starts):
+    """[Rollup or None for each of starts] for one manager (key = id) or department."""
+    found = {
+        row[0]: Rollup(*row[1:])
+        for row in conn.execute(
+            select(table.c.period_start, *(table.c[name] for name in _SUMS))
+            .where(_in_range(table, scope, key, period, starts))
+        )
+    }
+    return [found.get(start) for start in starts]
+
+
+def validator(conn, table, scope, key, period, starts):
+    """(row count, latest updated_at) over a series range."""
+    count, updated = conn.execute(
+        select(func.count(), func.max(table.c.updated_at)).where(_in_range(table, scope, key, period, starts))
+    ).one()
+    return count, updated
@@ -0,0 +1,84 @@
+# stats_local.py
+# Company / team statistics computed in SQL (COUNT, AVG, conditional SUM) instead of loading every row
+#
+# snapshot() runs two queries: one SELECT of scalar aggregate subqueries over
+# employees, goals and feedback, and one ORDER BY ... LIMIT for the top
+# performers. Models are passed in so this module does not import the
+# Flask app.
+
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+from sqlalchemy import func, case, select
+
+
+@dataclass(frozen=True)
+class TopPerformer:
+    name: str
+    score: Optional[int]
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    total_employees: int
+    avg_performance: float
+    completed_goals: int
+    pending_goals: int
+    feedback_count: int
+    top_performers: Tuple[TopPerformer, ...]
+    manager_id: Optional[int] = None
+
+    @property
+    def scope(self):
+        return "Team" if self.manager_id is not None else "Company"
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def snapshot(session, Employee, Goal, Feedback, manager_id=None, top_n=5):
+    """Aggregate stats for the whole company, or for one manager's team."""
+    team = select(Employee.id)
+    team_users = select(Employee.user_id)
+    if manager_id is not None:
+        team = team.where(Employee.manager_id == manager_id)
+        team_users = team_users.where(Employee.manager_id == manager_id)
+
+    def emp(col):
+        q = select(col)
+        return q.where(Employee.manager_id == manager_id) if manager_id is not None else q
+
+    def goals(col):
+        q = select(col)
+        return q.where(Goal.employee_id.in_(team)) if manager_id is not None else q
+
+    feedback = select(func.count(Feedback.id))
+    if manager_id is not None:
+        feedback = feedback.where(Feedback.user_id.in_(team_users))
+
+    # one round trip: every aggregate is a scalar subquery of a single SELECT
+    emp_count, avg_score, goal_count, completed, feedback_count = session.execute(select(
+        emp(func.count(Employee.id)).scalar_subquery(),
+        emp(func.avg(func.coalesce(Employee.performance_score, 0))).scalar_subquery(),
+        goals(func.count(Goal.id)).scalar_subquery(),
+        goals(func.sum(case((func.lower(Goal.status) == "completed", 1), else_=0))).scalar_subquery(),
+        feedback.scalar_subquery(),
+    )).one()
+
+    top_q = select(Employee.name, Employee.performance_score).order_by(
+        Employee.performance_score.desc(), Employee.id
+    ).limit(top_n)
+    if manager_id is not None:
+        top_q = top_q.where(Employee.manager_id == manager_id)
+    top = tuple(TopPerformer(name, score) for name, score in session.execute(top_q))
+
+    completed = int(completed or 0)
+    return StatsSnapshot(
+        total_employees=int(emp_count or 0),
+        avg_performance=round(float(avg_score), 2) if avg_score is not None else 0,
+        completed_goals=completed,
+        pending_goals=int(goal_count or 0) - completed,
+        feedback_count=int(feedback_count or 0),
+        top_performers=top,
+        manager_id=manager_id,
+    )
@@ -0,0 +1,183 @@
+# team_snapshot_local.py
+# Per-manager team snapshot (members, averages, goal completion) with a write-invalidated cache
+#
+# compute() builds the snapshot in two queries. The cache keeps one snapshot per
+# manager, either in this process or, when TEAM_SNAPSHOT_DB is set, in a SQLite
+# table shared by all workers. Each manager has a generation number bumped by
+# invalidate(); a snapshot computed before a bump is not stored.
+# TEAM_SNAPSHOT_TTL bounds staleness for writes that bypass the ORM hooks.
+
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+import threading
+import sqlite3
+import json
+import time
+import os
+
+from sqlalchemy import func, case, select
+
+TEAM_SNAPSHOT_DB = os.getenv("TEAM_SNAPSHOT_DB", "")  # empty: in-process cache only
+TEAM_SNAPSHOT_TTL = float(os.getenv("TEAM_SNAPSHOT_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class TeamMember:
+    id: int
+    name: str
+    position: Optional[str]
+    performance_score: int
+    commits: int
+
+
+@dataclass(frozen=True)
+class TeamSnapshot:
+    manager_id: int
+    members: Tuple[TeamMember, ...]  # by score, highest first
+    avg_performance: float
+    total_commits: int
+    goals_completed: int
+    goals_total: int
+    computed_at: float
+
+    @property
+    def top_performers(self):
+        return self.members[:5]
+
+    @property
+    def attention_needed(self):
+        return tuple(sorted(self.members, key=lambda m: (m.performance_score, m.id))[:5])
+
+    def count_below(self, score):
+        return sum(1 for m in self.members if m.performance_score < score)
+
+    def count_at_least(self, score):
+        return sum(1 for m in self.members if m.performance_score >= score)
+
+    def to_json(self):
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload)
+        data["members"] = tuple(TeamMember(**m) for m in data["members"])
+        return cls(**data)
+
+
+def compute(session, Employee, Goal, manager_id):
+    members = tuple(
+        TeamMember(id, name, position, score or 0, commits or 0)
+        for id, name, position, score, commits in session.execute(
+            select(Employee.id, Employee.name, Employee.position, Employee.performance_score, Employee.commits)
+            .where(Employee.manager_id == manager_id)
+            .order_by(Employee.performance_score.desc(), Employee.id)
+        )
+    )
+    goals_total, goals_completed = session.execute(
+        select(func.count(Goal.id), func.coalesce(func.sum(case((Goal.status == "Completed", 1), else_=0)), 0))
+        .join(Employee, Goal.employee_id == Employee.id)
+        .where(Employee.manager_id == manager_id)
+    ).one()
+    return TeamSnapshot(
+        manager_id=manager_id,
+        members=members,
+        avg_performance=sum(m.performance_score for m in members) / len(members) if members else 0,
+        total_commits=sum(m.commits for m in members),
+        goals_completed=int(goals_completed),
+        goals_total=int(goals_total),
+        computed_at=time.time(),
+    )
+
+
+class LocalSnapshotStore:
+    def __init__(self, ttl=TEAM_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._entries = {}      # manager_id -> snapshot
+        self._generations = {}  # manager_id -> int
+        self._all_generation = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, manager_id):
+        return (self._all_generation, self._generations.get(manager_id, 0))
+
+    def get(self, manager_id):
+        """(fresh snapshot or None, generation to pass to put())"""
+        with self._lock:
+            snap = self._entries.get(manager_id)
+            if snap is not None and time.time() - snap.computed_at > self.ttl:
+                del self._entries[manager_id]
+                snap = None
+            return snap, self._generation(manager_id)
+
+    def put(self, manager_id, snapshot, generation):
+        with self._lock:
+            if generation == self._generation(manager_id):
+                self._entries[manager_id] = snapshot
+
+    def invalidate(self, manager_ids=None):
+        """Drop the given managers' snapshots, or all of them when manager_ids is None."""
+        with self._lock:
+            if manager_ids is None:
+                self._entries.clear()
+                self._all_generation += 1
+                return
+            for manager_id in manager_ids:
+                self._entries.pop(manager_id, None)
+                self._generations[manager_id] = self._generations.get(manager_id, 0) + 1
+
+
+class SQLiteSnapshotStore:
+    """Same interface as LocalSnapshotStore, backed by a SQLite table every worker shares."""
+
+    def __init__(self, db_path, ttl=TEAM_SNAPSHOT_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS team_snapshots ("
+                " manager_id INTEGER PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0,"
+                " payload TEXT, computed_at REAL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, manager_id):
+        with self._conn() as conn:
+            # the row must exist before computing, so a concurrent invalidate(None) bumps it
+            conn.execute("INSERT OR IGNORE INTO team_snapshots (manager_id) VALUES (?)", (manager_id,))
+            generation, payload, computed_at = conn.execute(
+                "SELECT generation, payload, computed_at FROM team_snapshots WHERE manager_id = ?", (manager_id,)
+            ).fetchone()
+        if payload is None or time.time() - computed_at > self.ttl:
+            return None, generation
+        return TeamSnapshot.from_json(payload), generation
+
+    def put(self, manager_id, snapshot, generation):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE team_snapshots SET payload = ?, computed_at = ? WHERE manager_id = ? AND generation = ?",
+                (snapshot.to_json(), snapshot.computed_at, manager_id, generation)
+            )
+
+    def invalidate(self, manager_ids=None):
+        with self._conn() as conn:
+            if manager_ids is None:
+                conn.execute("UPDATE team_snapshots SET payload = NULL, generation = generation + 1")
+                return
+            for manager_id in manager_ids:
+                conn.execute("INSERT OR IGNORE INTO team_snapshots (manager_id) VALUES (?)", (manager_id,))
+                conn.execute(
+                    "UPDATE team_snapshots SET payload = NULL, generation = generation + 1 WHERE manager_id = ?",
+                    (manager_id,)
+                )
+
+
+def make_store():
+    return SQLiteSnapshotStore(TEAM_SNAPSHOT_DB) if TEAM_SNAPSHOT_DB else LocalSnapshotStore()
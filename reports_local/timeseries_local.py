@@ -0,0 +1,156 @@
+# timeseries_local.py
+# Weekly per-employee performance history (score, commits, goals planned / completed)
+#
+# One row per (employee, week starting Monday), keyed by exactly that pair in a
+# WITHOUT ROWID table, so a chart window for one employee or a team is a
+# primary-key range scan. load() upserts in executemany chunks. validator()
+# (row count, latest updated_at) over the same range is what the chart
+# endpoints turn into ETag / Last-Modified, so revalidating an unchanged chart
+# costs one aggregate. Each point also records the employee's manager and
+# department that week; pass a rollup table to load() to keep
+# rollups_local's team / department sums in step. Tables and models are passed
+# in so this module does not import the Flask app.
+
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import os
+
+from sqlalchemy import func, select, and_, or_, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from reports_local import rollups_local
+
+PERFORMANCE_LOAD_CHUNK = int(os.getenv("PERFORMANCE_LOAD_CHUNK", "5000"))
+PERFORMANCE_MAX_WEEKS = int(os.getenv("PERFORMANCE_MAX_WEEKS", "52"))
+
+Point = namedtuple(
+    "Point", "employee_id week_start performance_score commits goals_planned goals_completed manager_id department",
+    defaults=(None, None),
+)
+
+# IN-list sizes that stay under the 999 bind parameters SQLite allows per
+# statement before 3.32: (employee, week) pairs take two each, and
+# current_points() binds four dates besides its ids
+_KEYS_PER_SELECT = 499
+_IDS_PER_SELECT = 900
+
+_VALUES = ("performance_score", "commits", "goals_planned", "goals_completed")
+_STORED = _VALUES + ("manager_id", "department")
+
+
+def week_start(day):
+    """Monday of the week containing day (a date, datetime or ISO string)."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    if isinstance(day, datetime):
+        day = day.date()
+    return day - timedelta(days=day.weekday())
+
+
+def weeks_ending(day, n):
+    """The n week starts up to and including day's week, oldest first."""
+    last = week_start(day)
+    return [last - timedelta(weeks=k) for k in range(n - 1, -1, -1)]
+
+
+def load(conn, table, points, chunk=PERFORMANCE_LOAD_CHUNK, rollups=None):
+    """
+    Upsert points (Point tuples or dicts with the same keys). A point for an
+    (employee, week) already stored replaces it; an identical one is left alone
+    so its updated_at (and the charts' ETag) stays put. With a rollup table,
+    each chunk's old and new points are applied to it as deltas. Returns the
+    number of points loaded.
+    """
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.employee_id, table.c.week_start],
+        set_={name: stmt.excluded[name] for name in _STORED + ("updated_at",)},
+        where=or_(*(table.c[name].is_distinct_from(stmt.excluded[name]) for name in _STORED)),
+    )
+
+    def flush(batch):
+        before = []
+        if rollups is not None:
+            keys = list(batch)
+            for i in range(0, len(keys), _KEYS_PER_SELECT):
+                before.extend(Point(*row) for row in conn.execute(
+                    select(table.c.employee_id, table.c.week_start, *(table.c[name] for name in _STORED))
+                    .where(tuple_(table.c.employee_id, table.c.week_start).in_(keys[i:i + _KEYS_PER_SELECT]))
+                ))
+        conn.execute(stmt, list(batch.values()))
+        if rollups is not None:
+            after = [Point(**{name: row.get(name) for name in Point._fields}) for row in batch.values()]
+            rollups_local.apply(conn, rollups, before, after)
+        return len(batch)
+
+    now = datetime.utcnow()
+    written, batch = 0, {}  # (employee id, week) -> row; a later point for the same week wins
+    for point in points:
+        row = dict(point._asdict() if hasattr(point, "_asdict") else point)
+        row["week_start"] = week_start(row["week_start"])
+        row["updated_at"] = now
+        batch[(row["employee_id"], row["week_start"])] = row
+        if len(batch) >= chunk:
+            written, batch = written + flush(batch), {}
+    if batch:
+        written += flush(batch)
+    return written
+
+
+def current_points(conn, Employee, Goal, employee_ids, day=None):
+    """Points for day's week (default: this week) from the live employee and goal rows."""
+    first = week_start(day or datetime.utcnow())
+    last = first + timedelta(days=6)
+    planned = select(func.count(Goal.id)).where(
+        Goal.employee_id == Employee.id, Goal.due_date.between(first, last)
+    ).scalar_subquery()
+    completed = select(func.count(Goal.id)).where(
+        Goal.employee_id == Employee.id, Goal.completion_date.between(first, last)
+    ).scalar_subquery()
+    q = select(Employee.id, func.coalesce(Employee.performance_score, 0), func.coalesce(Employee.commits, 0),
+               planned, completed, Employee.manager_id, Employee.department)
+    if hasattr(employee_ids, "subquery"):  # a select of ids
+        chunks = [employee_ids]
+    else:
+        ids = list(employee_ids)
+        chunks = [ids[i:i + _IDS_PER_SELECT] for i in range(0, len(ids), _IDS_PER_SELECT)]
+    return [Point(employee_id, first, score, commits, planned, completed, manager_id, department)
+            for chunk in chunks
+            for employee_id, score, commits, planned, completed, manager_id, department
+            in conn.execute(q.where(Employee.id.in_(chunk)))]
+
+
+def _in_window(table, employee_ids, weeks):
+    return and_(table.c.employee_id.in_(employee_ids), table.c.week_start.between(weeks[0], weeks[-1]))
+
+
+def window(conn, table, employee_ids, weeks):
+    """{employee id: [Point or None for each of weeks]} for the employees that have any point in range."""
+    slot = {week: i for i, week in enumerate(weeks)}
+    series = {}
+    for row in conn.execute(
+        select(table.c.employee_id, table.c.week_start, *(table.c[name] for name in _VALUES))
+        .where(_in_window(table, employee_ids, weeks))
+    ):
+        series.setdefault(row[0], [None] * len(weeks))[slot[row[1]]] = Point(*row)
+    return series
+
+
+def team_totals(conn, table, employee_ids, weeks):
+    """[(goals planned, goals completed) summed over employee_ids] for each of weeks."""
+    totals = dict.fromkeys(weeks, (0, 0))
+    for week, planned, completed in conn.execute(
+        select(table.c.week_start, func.sum(table.c.goals_planned), func.sum(table.c.goals_completed))
+        .where(_in_window(table, employee_ids, weeks))
+        .group_by(table.c.week_start)
+    ):
+        totals[week] = (int(planned or 0), int(completed or 0))
+    return [totals[week] for week in weeks]
+
+
+def validator(conn, table, employee_ids, weeks):
+    """(row count, latest updated_at) over a window; changes whenever any point in it does."""
+    count, updated = conn.execute(
+        select(func.count(), func.max(table.c.updated_at)).where(_in_window(table, employee_ids, weeks))
+    ).one()
+    return count, updated
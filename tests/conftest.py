@@ -0,0 +1,62 @@
+# conftest.py
+# Shared fixtures: main imported against a throwaway, seeded SQLite database
+
+import importlib
+import os
+
+import pytest
+
+from reports_local.querycheck_local import route_statements
+
+# Hot routes per role of the session user, as checked by test_query_plans.py
+# and test_query_counts.py
+HOT_ROUTES = {
+    "Manager": ["/your-dashboard", "/team-dashboard", "/insights", "/leaderboard", "/goals",
+                "/feedback-received", "/performance_data"],
+    "Employee": ["/your-dashboard", "/insights", "/performance_data", "/personal_performance_data"],
+}
+
+
+@pytest.fixture(scope="session")
+def workwise(tmp_path_factory):
+    """
+    The main module, imported with WORKWISE_DB and REPORT_JOBS_DB pointing into
+    a temp directory so its engine never opens the real workwise.db, and seeded
+    with the sample data. Tests must not import main themselves.
+    """
+    tmp = tmp_path_factory.mktemp("workwise")
+    os.environ["WORKWISE_DB"] = str(tmp / "workwise.db")
+    os.environ["REPORT_JOBS_DB"] = str(tmp / "jobs.db")
+    main = importlib.import_module("main")
+    assert main.DB_PATH == os.environ["WORKWISE_DB"], "main was imported before the test database was set up"
+    main.app.config["TESTING"] = True
+    with main.app.app_context():
+        main.init_db()
+        main.migrate_db()
+    return main
+
+
+@pytest.fixture
+def run_routes(workwise):
+    """
+    run(routes=HOT_ROUTES) requests {role: [url]} as the first user of each
+    role and returns querycheck_local.route_statements() for them, failing the
+    test if any request did not succeed.
+    """
+    main = workwise
+
+    def run(routes=HOT_ROUTES):
+        users = {}
+        for role in routes:
+            user = main.User.query.filter_by(role=role).order_by(main.User.id).first()
+            if user is not None:
+                users[role] = user.id
+        runs = route_statements(main.app.test_client(), main.db.engine, users, routes,
+                                before_request=main.db.session.remove)
+        failed = [f"{url} ({role}): {run.status}" for (role, url), run in runs.items()
+                  if not 200 <= run.status < 300]
+        assert not failed, "non-2xx responses: " + ", ".join(failed)
+        return runs
+
+    with main.app.app_context():
+        yield run
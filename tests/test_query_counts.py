@@ -0,0 +1,49 @@
+# test_query_counts.py
+# A hot route's statement count must not grow with the number of rows it shows (N+1 queries)
+
+from datetime import datetime
+
+EXTRA_ROWS = 20
+
+
+def _add_sample_rows(main, n):
+    """
+    n goals, bonuses and feedback entries, spread over different team members
+    and feedback givers so per-row lazy loads would show up.
+    """
+    User, Employee = main.User, main.Employee
+    manager = User.query.filter_by(role="Manager").order_by(User.id).first()
+    emp_users = User.query.filter_by(role="Employee").order_by(User.id).limit(n).all()
+    team = Employee.query.filter_by(manager_id=manager.id).order_by(Employee.id).limit(n).all()
+    month = datetime.now().strftime("%B-%Y")
+    rows = []
+    for i in range(n):
+        emp = team[i % len(team)]
+        rows.append(main.Goal(title=f"Query check {i}", employee_id=emp.id,
+                              status="Completed" if i % 2 else "Assigned"))
+        rows.append(main.Bonus(amount=100, month=month, employee_id=emp.id))
+        giver = emp_users[i % len(emp_users)]
+        rows.append(main.Feedback(user_id=manager.id, giver_id=giver.id, comment=f"Query check {i}"))
+        rows.append(main.Feedback(user_id=giver.id, giver_id=manager.id, comment=f"Query check {i}"))
+        rows.append(main.Feedback(user_id=manager.id, giver_id=emp_users[0].id, comment=f"Query check {i}"))
+    main.db.session.add_all(rows)
+    main.db.session.commit()
+
+
+def _statement_counts(main, run_routes):
+    # cached team snapshots, LLM answers or a due leaderboard probe would change
+    # the count between passes, so every pass starts from the same cache state
+    main.team_snapshots.invalidate()
+    main.invalidate_llm_cache()
+    main.rebuild_leaderboard()
+    return {key: len(run.statements) for key, run in run_routes().items()}
+
+
+def test_statement_counts_do_not_grow_with_rows(workwise, run_routes):
+    main = workwise
+    before = _statement_counts(main, run_routes)
+    _add_sample_rows(main, EXTRA_ROWS)
+    after = _statement_counts(main, run_routes)
+    growth = [f"{url} ({role}): {before[role, url]} -> {after[role, url]} statements with {EXTRA_ROWS} more rows"
+              for role, url in before if after[role, url] > before[role, url]]
+    assert not growth, "\n".join(growth)
@@ -0,0 +1,16 @@
+# test_query_plans.py
+# The hot routes' filtered queries must be served by an index, not a full table scan
+
+from reports_local.querycheck_local import full_scans
+
+
+def test_hot_routes_do_not_scan_tables(workwise, run_routes):
+    main = workwise
+    runs = run_routes()
+    tables = set(main.db.metadata.tables)
+    problems = []
+    with main.db.engine.connect() as conn:
+        for (role, url), run in runs.items():
+            for table, statement in full_scans(conn, run.statements, tables):
+                problems.append(f"{url} ({role}): full scan of {table}: {statement[:200]}")
+    assert not problems, "\n".join(problems)